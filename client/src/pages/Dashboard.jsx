@@ -159,6 +159,10 @@ const SocialMediaDashboard = () => {
 
     fetchData();
 
+    // Refetch as soon as the server announces a new analysis; the timer stays as a fallback
+    const events = new EventSource("http://localhost:5000/api/trends/stream");
+    events.addEventListener("trends", fetchData);
+
     const refreshInterval = setInterval(fetchData, 35 * 60 * 1000);
 
     const countdownInterval = setInterval(() => {
@@ -169,6 +173,7 @@ const SocialMediaDashboard = () => {
     }, 1000);
 
     return () => {
+      events.close();
       clearInterval(refreshInterval);
       clearInterval(countdownInterval);
     };
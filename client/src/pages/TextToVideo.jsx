@@ -68,6 +68,12 @@ const aiProcessingSteps = [
   "Finalizing video output...",
 ];
 
+// Milliseconds between video job status checks
+const JOB_POLL_INTERVAL = 3000;
+
+// Milliseconds after which an unfinished video job is reported as failed
+const JOB_POLL_TIMEOUT = 15 * 60 * 1000;
+
 // Icons for the loading animation
 const loadingIcons = [
   { icon: Wand2, color: "text-teal-400" },
@@ -126,8 +132,8 @@ export default function TextToVideo() {
     setCurrentStep(0);
 
     try {
-      // Make the API call to generate video
-      const response = await fetch("http://localhost:5000/api/generate-video", {
+      // Queue the video generation job
+      const response = await fetch("http://localhost:5000/api/video-jobs", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -139,12 +145,28 @@ export default function TextToVideo() {
         throw new Error("Failed to generate video");
       }
 
-      // Handle the video file response
-      const videoBlob = await response.blob();
-      const videoObjectUrl = URL.createObjectURL(videoBlob);
+      // Poll the job until the video is rendered
+      const { statusUrl } = await response.json();
+      const deadline = Date.now() + JOB_POLL_TIMEOUT;
+      let job;
+      do {
+        if (Date.now() > deadline) {
+          throw new Error("Video generation timed out");
+        }
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+        const statusResponse = await fetch(`http://localhost:5000${statusUrl}`);
+        if (!statusResponse.ok) {
+          throw new Error("Failed to retrieve video job");
+        }
+        job = await statusResponse.json();
+      } while (job.state === "queued" || job.state === "running");
+
+      if (job.state !== "succeeded") {
+        throw new Error(job.error || "Failed to generate video");
+      }
 
-      // Set the video URL from the blob
-      setVideoUrl(videoObjectUrl);
+      // Video files are served by the result endpoint, the video API may also return a URL
+      setVideoUrl(job.videoUrl || `http://localhost:5000${job.resultUrl}`);
       setLoading(false);
       toast.success("Video generated successfully!");
 
@@ -0,0 +1,19 @@
+"""
+Imported at startup by the server processes run_load.py starts with --mongo memory
+(this directory is put on their PYTHONPATH): swaps pymongo.MongoClient for an in-memory
+mongomock client seeded with seed_data.py, so the server runs without a MongoDB.
+"""
+import mongomock
+import pymongo
+from seed_data import seed_trends
+
+
+class SeededMongoClient(mongomock.MongoClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        trends = self["PixelFlowLabs"]["trends"]
+        if not trends.count_documents({}):
+            seed_trends(trends)
+
+
+pymongo.MongoClient = SeededMongoClient
@@ -0,0 +1,338 @@
+"""
+Load test of the trends API against local stand-ins, so it runs anywhere and repeats.
+
+Starts the stand-ins for Gemini and the video API (stand_ins.py), a seeded database and
+one server configuration, then runs closed-loop clients picking requests from a weighted
+mix for a fixed duration, and prints throughput and latency percentiles per endpoint:
+
+    python loadtest/run_load.py --server gthread --concurrency 32 --duration 60
+    python loadtest/run_load.py --mix trends=80,history=20 --save before.json
+    python loadtest/run_load.py --mix trends=80,history=20 --compare before.json
+
+Database (--mongo):
+- memory: an in-memory mongomock database seeded in every server process (needs
+  mongomock installed), video jobs then only work with a single worker, which is forced
+- a MongoDB URI (e.g. a throwaway local mongod): seeded with seed_data.py when its
+  trends collection is empty, shared by all workers like in production
+
+Request mix (--mix, relative weights):
+- trends: GET /api/trends, mostly the default domain, sometimes a domain or a field subset
+- history: GET /api/trends/history
+- generate: POST /api/generate-video, the synchronous pipeline (Gemini + video download)
+- job: POST /api/video-jobs, then polls the job to completion and downloads the result;
+  reported both as the submit request and end to end
+- batch: POST /api/generate-video/batch with --batch-size products (jobs are not polled)
+
+Generation requests draw products from a pool of --products names, so the share of
+prompt and video cache hits can be tuned (a small pool means mostly cache hits).
+Per-client rate limiting is disabled in the server so the clients measure capacity, not
+the limiter; requests answered 429 are counted as rejected.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+import requests
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.join(os.path.dirname(LOADTEST_DIR), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from benchmark_serving import SERVERS, percentile, wait_until_ready  # noqa: E402
+from seed_data import DOMAINS, seed_trends  # noqa: E402
+
+DEFAULT_MIX = "trends=70,history=10,generate=10,job=10"
+
+# Seconds between polls of a video job
+JOB_POLL_INTERVAL = 0.5
+
+# Seconds after which a request or a job counts as failed
+REQUEST_TIMEOUT = 300
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint label, shared by all clients"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    def record(self, label, started, status=None):
+        """Record a finished request, status None for a failed connection or timeout"""
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if status is None or status >= 500:
+                self.errors[label] += 1
+            elif status == 429:
+                self.rejected[label] += 1
+            else:
+                self.latencies[label].append(elapsed)
+
+    def report(self, elapsed):
+        labels = sorted(set(self.latencies) | set(self.errors) | set(self.rejected))
+        results = {}
+        for label in labels:
+            values = sorted(self.latencies[label])
+            results[label] = {
+                "requests": len(values),
+                "requests_per_second": len(values) / elapsed,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "errors": self.errors[label],
+                "rejected": self.rejected[label]
+            }
+        return results
+
+
+def product(rng, pool_size):
+    index = rng.randrange(pool_size)
+    return {
+        "productName": f"Product {index}",
+        "description": f"A lightweight gadget, model {index}, for creators on the move",
+        "scenes": "Unboxing on a desk, close-up of the product, creator using it outdoors",
+        "num_frames": 49,
+        "fps": 8
+    }
+
+
+def request_trends(session, base_url, rng, recorder, args):
+    params = {}
+    roll = rng.random()
+    if roll < 0.2:
+        params["domain"] = rng.choice([domain for domain in DOMAINS if domain])
+    elif roll < 0.3:
+        params["fields"] = "top_hashtags,top_words,sentiment"
+    started = time.perf_counter()
+    response = session.get(f"{base_url}/api/trends", params=params, timeout=REQUEST_TIMEOUT,
+                           headers={"Accept-Encoding": "gzip, br"})
+    response.content
+    recorder.record("GET /api/trends", started, response.status_code)
+
+
+def request_history(session, base_url, rng, recorder, args):
+    params = {"bucket": rng.choice(["hour", "day"])}
+    if rng.random() < 0.5:
+        params["domain"] = rng.choice([domain for domain in DOMAINS if domain])
+    started = time.perf_counter()
+    response = session.get(f"{base_url}/api/trends/history", params=params, timeout=REQUEST_TIMEOUT)
+    response.content
+    recorder.record("GET /api/trends/history", started, response.status_code)
+
+
+def request_generate(session, base_url, rng, recorder, args):
+    started = time.perf_counter()
+    with session.post(f"{base_url}/api/generate-video", json=product(rng, args.products),
+                      timeout=REQUEST_TIMEOUT, stream=True) as response:
+        for _ in response.iter_content(64 * 1024):
+            pass
+    recorder.record("POST /api/generate-video", started, response.status_code)
+
+
+def request_job(session, base_url, rng, recorder, args):
+    started = time.perf_counter()
+    response = session.post(f"{base_url}/api/video-jobs", json=product(rng, args.products), timeout=REQUEST_TIMEOUT)
+    recorder.record("POST /api/video-jobs", started, response.status_code)
+    if response.status_code != 202:
+        return
+
+    status_url = f"{base_url}{response.json()['statusUrl']}"
+    deadline = started + REQUEST_TIMEOUT
+    try:
+        while time.perf_counter() < deadline:
+            time.sleep(JOB_POLL_INTERVAL)
+            job = session.get(status_url, timeout=REQUEST_TIMEOUT).json()
+            if job.get("state") == "failed":
+                break
+            if job.get("state") == "succeeded":
+                with session.get(f"{base_url}{job['resultUrl']}", timeout=REQUEST_TIMEOUT, stream=True) as result:
+                    for _ in result.iter_content(64 * 1024):
+                        pass
+                recorder.record("video job end to end", started, result.status_code)
+                return
+    except (requests.RequestException, ValueError):
+        pass
+    recorder.record("video job end to end", started)
+
+
+def request_batch(session, base_url, rng, recorder, args):
+    items = [product(rng, args.products) for _ in range(args.batch_size)]
+    started = time.perf_counter()
+    response = session.post(f"{base_url}/api/generate-video/batch", json={"items": items}, timeout=REQUEST_TIMEOUT)
+    recorder.record("POST /api/generate-video/batch", started, response.status_code)
+
+
+# Scenario name: (label of its first request, function)
+SCENARIOS = {
+    "trends": ("GET /api/trends", request_trends),
+    "history": ("GET /api/trends/history", request_history),
+    "generate": ("POST /api/generate-video", request_generate),
+    "job": ("POST /api/video-jobs", request_job),
+    "batch": ("POST /api/generate-video/batch", request_batch)
+}
+
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}, expected one of: {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def run_mix(base_url, weights, args):
+    """Closed-loop clients, each with its own session and random stream, for args.duration seconds"""
+    recorder = Recorder()
+    names = list(weights)
+    stop_at = time.perf_counter() + args.duration
+
+    def client(index):
+        session = requests.Session()
+        rng = random.Random(args.seed + index)
+        while time.perf_counter() < stop_at:
+            label, scenario = SCENARIOS[rng.choices(names, weights=list(weights.values()))[0]]
+            started = time.perf_counter()
+            try:
+                scenario(session, base_url, rng, recorder, args)
+            except requests.RequestException:
+                recorder.record(label, started)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - started)
+
+
+def print_report(results, baseline=None):
+    print("| endpoint | requests | req/s | p50 ms | p95 ms | p99 ms | errors | rejected |")
+    print("|---|---|---|---|---|---|---|---|")
+    for label, result in results.items():
+        row = (f"| {label} | {result['requests']} | {result['requests_per_second']:.1f} | {result['p50_ms']:.1f} | "
+               f"{result['p95_ms']:.1f} | {result['p99_ms']:.1f} | {result['errors']} | {result['rejected']} |")
+        print(row)
+
+    if not baseline:
+        return
+    print()
+    print("| endpoint | req/s change | p95 change | p99 change |")
+    print("|---|---|---|---|")
+    for label, result in results.items():
+        before = baseline.get(label)
+        if not before:
+            continue
+        changes = [
+            (result[key] - before[key]) / before[key] * 100 if before[key] else float("nan")
+            for key in ("requests_per_second", "p95_ms", "p99_ms")
+        ]
+        print(f"| {label} | {changes[0]:+.1f}% | {changes[1]:+.1f}% | {changes[2]:+.1f}% |")
+
+
+def prepare_database(mongo, env):
+    """Seed the database, returns the environment the server needs to use it"""
+    if mongo == "memory":
+        # sitecustomize in memory_mongo/ swaps pymongo.MongoClient for a seeded mongomock client
+        path = os.pathsep.join([os.path.join(LOADTEST_DIR, "memory_mongo"), LOADTEST_DIR, env.get("PYTHONPATH", "")])
+        return {"PYTHONPATH": path, "GUNICORN_WORKERS": "1"}
+
+    from pymongo import MongoClient
+    trends = MongoClient(mongo)["PixelFlowLabs"]["trends"]
+    if not trends.count_documents({}, limit=1):
+        print(f"Seeded {seed_trends(trends)} trend documents", file=sys.stderr)
+    return {"MONGO_URI": mongo}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="gthread", choices=["dev", "gthread", "gevent"])
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URI to seed and use")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated scenario=weight")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed-loop clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    parser.add_argument("--products", type=int, default=50, help="distinct products in generation requests")
+    parser.add_argument("--batch-size", type=int, default=5, help="products per batch request")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the clients")
+    parser.add_argument("--port", type=int, default=5200, help="server port, the stand-ins use the next two")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="mean seconds per Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.3)
+    parser.add_argument("--video-latency", type=float, default=5.0, help="mean seconds before the video starts")
+    parser.add_argument("--video-jitter", type=float, default=1.0)
+    parser.add_argument("--video-mb", type=float, default=8, help="size of each generated video")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="share of Gemini calls failing")
+    parser.add_argument("--video-error-rate", type=float, default=0.0, help="share of video calls failing")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--server-log", help="write the server output to this file instead of discarding it")
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    gemini_port, video_port = args.port + 1, args.port + 2
+    stand_ins = subprocess.Popen(
+        [sys.executable, os.path.join(LOADTEST_DIR, "stand_ins.py"),
+         "--gemini-port", str(gemini_port), "--video-port", str(video_port),
+         "--gemini-latency", str(args.gemini_latency), "--gemini-jitter", str(args.gemini_jitter),
+         "--video-latency", str(args.video_latency), "--video-jitter", str(args.video_jitter),
+         "--video-mb", str(args.video_mb), "--gemini-error-rate", str(args.gemini_error_rate),
+         "--video-error-rate", str(args.video_error_rate)],
+        stdout=subprocess.DEVNULL
+    )
+    server = None
+    server_log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    try:
+        with tempfile.TemporaryDirectory(prefix="loadtest-artifacts-") as artifact_dir:
+            command, env = SERVERS[args.server](args.port)
+            env = {
+                **os.environ,
+                **env,
+                "GEMINI_API_KEY": "loadtest",
+                "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{gemini_port}",
+                "VIDEO_API_URL": f"http://127.0.0.1:{video_port}/generate-video",
+                "VIDEO_RATE_PER_MINUTE": "0",
+                "ARTIFACT_DIR": artifact_dir
+            }
+            env.update(prepare_database(args.mongo, env))
+            server = subprocess.Popen(command, cwd=SERVER_DIR, env=env,
+                                      stdout=server_log, stderr=subprocess.STDOUT)
+
+            base_url = f"http://127.0.0.1:{args.port}"
+            if not wait_until_ready(f"{base_url}/api/trends"):
+                raise SystemExit(f"{args.server} server did not start")
+
+            if args.warmup:
+                run_mix(base_url, weights, argparse.Namespace(**{**vars(args), "duration": args.warmup}))
+            results = run_mix(base_url, weights, args)
+
+            baseline = None
+            if args.compare:
+                with open(args.compare) as f:
+                    baseline = json.load(f)["results"]
+            print(f"{args.server} server, {args.concurrency} clients, {args.duration:.0f}s, mix {args.mix}")
+            print_report(results, baseline)
+            if args.save:
+                with open(args.save, "w") as f:
+                    json.dump({"config": vars(args), "results": results}, f, indent=2)
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+        stand_ins.terminate()
+        stand_ins.wait(timeout=30)
+        if args.server_log:
+            server_log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Trends documents shaped like the ones trend_job/trend_analyzer.py stores, with sizes
+close to production (top lists, velocity, per-platform posts), for seeding a test database.
+"""
+import random
+import datetime
+
+DOMAINS = [None, "tech", "fashion", "fitness", "food"]
+
+WORDS = ["launch", "review", "unboxing", "tutorial", "ai", "viral", "challenge", "budget", "premium",
+         "summer", "routine", "hack", "setup", "aesthetic", "minimal", "creator", "drop", "collab",
+         "sustainable", "vintage", "workout", "recipe", "travel", "gadget", "skincare", "gaming"]
+
+
+def _counts(rng, prefix, size):
+    return {f"{prefix}{rng.choice(WORDS)}{index}": rng.randint(5, 500) for index in range(size)}
+
+
+def _posts(rng, count):
+    return [{
+        "title": " ".join(rng.choice(WORDS) for _ in range(12)),
+        "text": " ".join(rng.choice(WORDS) for _ in range(80)),
+        "score": rng.randint(0, 50000),
+        "comments": rng.randint(0, 3000),
+        "url": f"https://example.com/post/{rng.getrandbits(48):x}"
+    } for _ in range(count)]
+
+
+def _velocity(rng, size, rising):
+    """Entries shaped like trend_job/trend_velocity.py's rising/fading lists"""
+    entries = []
+    for _ in range(size):
+        expected = round(rng.uniform(5, 100), 2)
+        count = round(expected * rng.uniform(1.5, 4)) if rising else round(expected * rng.uniform(0, 0.5))
+        z_score = rng.uniform(3, 8)
+        entries.append({"term": rng.choice(WORDS), "kind": rng.choice(["hashtag", "word"]), "count": count,
+                        "expected": expected, "velocity": round(count - expected, 2),
+                        "z_score": round(z_score if rising else -z_score, 2)})
+    return entries
+
+
+def trend_document(domain=None, timestamp=None, rng=None):
+    """One analysis document, about 140 KB of BSON of which most is platform_data"""
+    rng = rng or random.Random()
+    timestamp = timestamp or datetime.datetime.utcnow()
+    top_hashtags = _counts(rng, "#", 50)
+    return {
+        "timestamp": timestamp,
+        "domain": domain,
+        "top_hashtags": top_hashtags,
+        "top_canonical_hashtags": dict(list(top_hashtags.items())[:30]),
+        "top_words": _counts(rng, "", 100),
+        "distinctive_terms": {rng.choice(WORDS) + str(index): round(rng.random(), 3) for index in range(30)},
+        "top_trends": [" ".join(rng.sample(WORDS, 2)) for _ in range(20)],
+        "trend_velocity": {"rising": _velocity(rng, 15, True), "fading": _velocity(rng, 15, False)},
+        "language_volume": {"en": rng.randint(500, 5000), "es": rng.randint(50, 500), "pt": rng.randint(10, 200)},
+        "sentiment": {
+            "overall_mood": rng.choice(["positive", "neutral", "negative"]),
+            "data": {
+                "textblob": {"avg_polarity": round(rng.uniform(-0.2, 0.5), 3),
+                             "avg_subjectivity": round(rng.uniform(0.2, 0.7), 3)},
+                "transformer": {"positive_percentage": round(rng.uniform(30, 80), 1),
+                                "avg_confidence": round(rng.uniform(0.6, 0.95), 3)}
+            }
+        },
+        "ai_analysis": {
+            "key_insights": [" ".join(rng.sample(WORDS, 8)) for _ in range(5)],
+            "emerging_patterns": [" ".join(rng.sample(WORDS, 4)) for _ in range(5)],
+            "sentiment_analysis": " ".join(rng.choice(WORDS) for _ in range(60)),
+            "content_recommendations": [" ".join(rng.sample(WORDS, 6)) for _ in range(5)],
+            "trend_prediction": " ".join(rng.choice(WORDS) for _ in range(60)),
+            "summary": " ".join(rng.choice(WORDS) for _ in range(150))
+        },
+        "platform_data": {
+            "reddit": {"trending_subreddits": [{"name": rng.choice(WORDS), "subscribers": rng.randint(1000, 10 ** 6)}
+                                               for _ in range(10)],
+                       "hot_posts": _posts(rng, 60)},
+            "youtube": {"trending_videos": _posts(rng, 40)},
+            "bluesky": {"popular_posts": _posts(rng, 60), "trending_hashtags": _counts(rng, "#", 20)}
+        }
+    }
+
+
+def seed_trends(collection, history_hours=48, interval_hours=3, seed=42):
+    """
+    Insert an analysis per domain every `interval_hours` over the last `history_hours`,
+    as the scheduled trend job would have. Returns the number of documents inserted.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    documents = [
+        trend_document(domain, now - datetime.timedelta(hours=hours_ago), rng)
+        for hours_ago in range(history_hours, -1, -interval_hours)
+        for domain in DOMAINS
+    ]
+    collection.insert_many(documents)
+    return len(documents)
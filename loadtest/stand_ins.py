@@ -0,0 +1,186 @@
+"""
+Local stand-ins for the external APIs the server calls, with injected latency:
+
+- a Gemini REST endpoint (POST /v1beta/models/<model>:generateContent) answering with
+  JSON that follows the requested response schema, point the server at it with
+  GEMINI_API_ENDPOINT=http://127.0.0.1:<port>
+- a video API (POST /generate-video) that waits for the render time and then streams
+  an mp4 body of the configured size, point the server at it with VIDEO_API_URL
+
+Run on their own to try the server by hand:
+
+    python stand_ins.py --gemini-port 9101 --video-port 9102 --video-mb 8
+"""
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHUNK_SIZE = 64 * 1024
+
+# Body of the fake videos, repeated up to the requested size
+_VIDEO_BLOCK = random.Random(0).randbytes(1024 * 1024)
+
+
+class Latency:
+    """Delay drawn uniformly from mean +/- jitter seconds, never negative"""
+
+    def __init__(self, mean, jitter=0.0):
+        self.mean = mean
+        self.jitter = jitter
+
+    def sleep(self):
+        delay = self.mean + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Schema types as sent by the REST client (enum numbers) or written by hand (names)
+SCHEMA_TYPES = {1: "string", 2: "number", 3: "integer", 4: "boolean", 5: "array", 6: "object"}
+
+
+def _fill_schema(schema, seed):
+    """Value following a (Gemini subset of) JSON schema, strings derived from `seed`"""
+    kind = (schema or {}).get("type", "string")
+    kind = SCHEMA_TYPES.get(kind, str(kind).lower())
+    if kind == "object":
+        return {name: _fill_schema(value, f"{seed}-{name}") for name, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        count = int(schema.get("minItems", 1))
+        return [_fill_schema(schema.get("items"), f"{seed}-{index}") for index in range(count)]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return True
+    return f"A cinematic product video, seed {seed}"
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return body, json.loads(body or b"{}")
+        except ValueError:
+            return body, {}
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def gemini_handler(latency, error_rate=0.0):
+    class GeminiHandler(_QuietHandler):
+        def do_POST(self):
+            body, request = self._read_json()
+            latency.sleep()
+            if random.random() < error_rate:
+                self._send_json(503, {"error": {"code": 503, "message": "Injected failure", "status": "UNAVAILABLE"}})
+                return
+
+            # Same request, same answer, so the server's prompt cache behaves as with the real API
+            seed = hashlib.sha256(body).hexdigest()[:12]
+            config = request.get("generationConfig", {})
+            if config.get("responseMimeType") == "application/json":
+                text = json.dumps(_fill_schema(config.get("responseSchema"), seed))
+            else:
+                text = f"A cinematic product video, seed {seed}"
+            self._send_json(200, {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": len(body) // 4, "candidatesTokenCount": len(text) // 4,
+                                  "totalTokenCount": (len(body) + len(text)) // 4}
+            })
+    return GeminiHandler
+
+
+def video_handler(latency, size_bytes, error_rate=0.0):
+    class VideoHandler(_QuietHandler):
+        def do_POST(self):
+            self._read_json()
+            # Render time before the first byte
+            latency.sleep()
+            if random.random() < error_rate:
+                self._send_json(503, {"error": "Injected failure"})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(size_bytes))
+            self.end_headers()
+            sent = 0
+            try:
+                while sent < size_bytes:
+                    offset = sent % len(_VIDEO_BLOCK)
+                    chunk = _VIDEO_BLOCK[offset:offset + min(CHUNK_SIZE, size_bytes - sent)]
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # The server closed the upstream request (client went away)
+                self.close_connection = True
+    return VideoHandler
+
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping pooled keep-alive connections is expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_server(handler, port=0, host="127.0.0.1"):
+    """Serve `handler` on a daemon thread, returns the server (server_port holds the bound port)"""
+    server = _StandInServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_stand_ins(gemini_latency, video_latency, video_mb, gemini_port=0, video_port=0,
+                    gemini_error_rate=0.0, video_error_rate=0.0):
+    """Start both stand-ins, returns (gemini_server, video_server)"""
+    gemini = start_server(gemini_handler(gemini_latency, gemini_error_rate), gemini_port)
+    video = start_server(video_handler(video_latency, int(video_mb * 1024 * 1024), video_error_rate), video_port)
+    return gemini, video
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gemini-port", type=int, default=9101)
+    parser.add_argument("--video-port", type=int, default=9102)
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="mean seconds per Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.3)
+    parser.add_argument("--video-latency", type=float, default=5.0, help="mean seconds before the video starts")
+    parser.add_argument("--video-jitter", type=float, default=1.0)
+    parser.add_argument("--video-mb", type=float, default=8, help="size of each video")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="share of Gemini calls answered 503")
+    parser.add_argument("--video-error-rate", type=float, default=0.0, help="share of video calls answered 503")
+    args = parser.parse_args()
+
+    gemini, video = start_stand_ins(Latency(args.gemini_latency, args.gemini_jitter),
+                                    Latency(args.video_latency, args.video_jitter), args.video_mb,
+                                    args.gemini_port, args.video_port, args.gemini_error_rate, args.video_error_rate)
+    print(f"GEMINI_API_ENDPOINT=http://127.0.0.1:{gemini.server_port}")
+    print(f"VIDEO_API_URL=http://127.0.0.1:{video.server_port}/generate-video")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
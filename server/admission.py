@@ -0,0 +1,221 @@
+import os
+import math
+import time
+import logging
+import ipaddress
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request, jsonify, make_response, g
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Video generations running at once in this process, further requests wait in a queue
+VIDEO_MAX_CONCURRENT = int(os.getenv("VIDEO_MAX_CONCURRENT", "4"))
+
+# Requests allowed to wait for a slot, beyond that they are rejected straight away
+VIDEO_MAX_QUEUE = int(os.getenv("VIDEO_MAX_QUEUE", "8"))
+
+# Seconds a request may wait for a slot before it is rejected
+VIDEO_QUEUE_TIMEOUT = float(os.getenv("VIDEO_QUEUE_TIMEOUT", "30"))
+
+# Per-client token bucket: sustained video requests per minute and burst size
+VIDEO_RATE_PER_MINUTE = float(os.getenv("VIDEO_RATE_PER_MINUTE", "6"))
+VIDEO_RATE_BURST = int(os.getenv("VIDEO_RATE_BURST", "3"))
+
+# Token buckets kept in memory, least recently seen clients are forgotten first
+MAX_TRACKED_CLIENTS = 10000
+
+# Retry-After suggested when saturated and no service time has been measured yet
+DEFAULT_RETRY_AFTER = 10
+
+# Addresses or networks of the reverse proxies whose X-Real-IP header is trusted (comma-separated)
+TRUSTED_PROXIES = [ipaddress.ip_network(proxy.strip(), strict=False)
+                   for proxy in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if proxy.strip()]
+
+admission_rejections = Counter("admission_rejections_total",
+                               "Requests rejected by admission control, by limiter and reason")
+admission_wait = Histogram("admission_wait_seconds", "Time requests waited for an execution slot, by limiter")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted, with the seconds the client should wait"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBuckets:
+    """Per-client token buckets refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate, burst, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, client_id):
+        """Take a token, returns 0 on success or the seconds until a token is available"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(client_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client_id] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def refund(self, client_id):
+        with self._lock:
+            if client_id in self._buckets:
+                tokens, updated_at = self._buckets[client_id]
+                self._buckets[client_id] = (min(self.burst, tokens + 1), updated_at)
+
+
+class AdmissionController:
+    """
+    Concurrency cap with a bounded wait queue and per-client rate limits.
+
+    A request first takes a token from its client's bucket, then takes a free slot or waits
+    for one. When the queue is full or the wait times out the request is rejected with a
+    Retry-After estimated from the measured time a slot is held, so clients back off
+    instead of piling more work onto the upstream APIs.
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, rate_per_minute, burst):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.buckets = TokenBuckets(rate_per_minute / 60, burst)
+        self._condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self._service_time = None
+
+    def _retry_after(self):
+        """Seconds until the queue ahead of a new request has likely drained (caller holds the lock)"""
+        if self._service_time is None:
+            return DEFAULT_RETRY_AFTER
+        return self._service_time * (self.waiting + 1) / self.max_concurrent
+
+    def _reject(self, reason, retry_after):
+        admission_rejections.inc(limiter=self.name, reason=reason)
+        raise AdmissionRejected(reason, retry_after)
+
+    def acquire(self, client_id):
+        """Take an execution slot for a client, raises AdmissionRejected"""
+        wait = self.buckets.take(client_id)
+        if wait:
+            self._reject("rate_limited", wait)
+
+        start = time.perf_counter()
+        with self._condition:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    self.buckets.refund(client_id)
+                    self._reject("queue_full", self._retry_after())
+
+                self.waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.active < self.max_concurrent,
+                                                        self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.buckets.refund(client_id)
+                    self._reject("queue_timeout", self._retry_after())
+            self.active += 1
+
+        admission_wait.observe(time.perf_counter() - start, limiter=self.name)
+        return time.perf_counter()
+
+    def release(self, acquired_at):
+        held = time.perf_counter() - acquired_at
+        with self._condition:
+            self.active -= 1
+            # Moving average of the time a slot is held, for Retry-After estimates
+            self._service_time = held if self._service_time is None else 0.8 * self._service_time + 0.2 * held
+            self._condition.notify()
+
+
+def is_trusted_proxy(address):
+    """Whether a peer address belongs to TRUSTED_PROXIES"""
+    try:
+        peer = ipaddress.ip_address(address)
+    except (TypeError, ValueError):
+        return False
+    return any(peer in network for network in TRUSTED_PROXIES)
+
+
+def forwarded_client(peer, real_ip):
+    """Client address: X-Real-IP when the peer is a trusted proxy, otherwise the peer itself"""
+    if real_ip and is_trusted_proxy(peer):
+        return real_ip
+    return peer or "unknown"
+
+
+def client_id():
+    """Client address, as forwarded by nginx when behind the proxy"""
+    return forwarded_client(request.remote_addr, request.headers.get("X-Real-IP"))
+
+
+def rejection_response(rejection):
+    if rejection.reason == "rate_limited":
+        error = "Too many video requests, try again later"
+    else:
+        error = "Server is busy, try again later"
+    response = jsonify({"error": error, "reason": rejection.reason, "retryAfter": rejection.retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(rejection.retry_after)
+    return response
+
+
+def admission_controlled(controller):
+    """
+    Decorator running a view inside an execution slot of `controller`. Views that return
+    a stream still doing the work (setting g.hold_admission_slot) keep the slot until the
+    stream is closed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                acquired_at = controller.acquire(client_id())
+            except AdmissionRejected as rejection:
+                logger.warning(f"Rejected {request.path} for {client_id()}: {rejection.reason}")
+                return rejection_response(rejection)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                controller.release(acquired_at)
+                raise
+
+            if g.get("hold_admission_slot"):
+                response.call_on_close(lambda: controller.release(acquired_at))
+            else:
+                controller.release(acquired_at)
+            return response
+        return wrapper
+    return decorator
+
+
+video_admission = AdmissionController("video", VIDEO_MAX_CONCURRENT, VIDEO_MAX_QUEUE, VIDEO_QUEUE_TIMEOUT,
+                                      VIDEO_RATE_PER_MINUTE, VIDEO_RATE_BURST)
+
+admission_in_flight = Gauge("admission_in_flight", "Requests holding a video generation slot",
+                            callback=lambda: video_admission.active)
+admission_queue_depth = Gauge("admission_queue_depth", "Requests waiting for a video generation slot",
+                              callback=lambda: video_admission.waiting)
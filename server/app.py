@@ -6,7 +6,10 @@ import logging
 
 # Import the API routes
 from routes import register_routes
+from request_metrics import init_request_metrics
 from db_service import initialize_db
+from trends_cache import start_trends_watcher
+from video_jobs import start_video_jobs
 
 # Load environment variables
 load_dotenv()
@@ -22,16 +25,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable Cross-Origin Resource Sharing
 
-# Initialize database connection
-initialize_db()
+def start_services():
+    """
+    Open the database connection and start the background threads.
+    Runs once per process: under gunicorn in every worker after the fork, since
+    MongoClient connections and threads do not survive a fork.
+    """
+    # Initialize database connection
+    initialize_db()
+
+    # Keep the latest trends document in memory, refreshed when new analyses land
+    start_trends_watcher()
+
+    # Heartbeat the video jobs of this process and resume jobs abandoned by others
+    start_video_jobs()
+
+
+def create_app(start=True):
+    """
+    Application factory. With start=False only the app is built (routes, config),
+    so a preloading server can share it across workers and call start_services() in each.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable Cross-Origin Resource Sharing
+
+    # Latency and in-flight metrics for every route
+    init_request_metrics(app)
+
+    # Register all routes
+    register_routes(app)
+
+    if start:
+        start_services()
+    return app
 
-# Register all routes
-register_routes(app)
 
 if __name__ == "__main__":
-    logger.info("Starting Flask Trends API server on port 5000")
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    # Development server, production runs gunicorn with wsgi:app (see gunicorn.conf.py)
+    app = create_app()
+    port = int(os.getenv("PORT", "5000"))
+    logger.info(f"Starting Flask Trends API server on port {port}")
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import logging
+import fcntl
+import tempfile
+from flask import Response, send_file
+
+logger = logging.getLogger(__name__)
+
+# Directory holding generated videos and cached video API answers
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "pixelflow_artifacts"))
+
+# Disk quota of the artifact directory, least recently used artifacts are deleted beyond it
+ARTIFACT_MAX_BYTES = int(float(os.getenv("ARTIFACT_MAX_MB", "2048")) * 1024 * 1024)
+
+# Artifacts not used for this many hours are deleted (0 keeps them until the quota is reached)
+ARTIFACT_MAX_AGE = float(os.getenv("ARTIFACT_MAX_AGE_HOURS", "72")) * 3600
+
+# Internal nginx location mapped to ARTIFACT_DIR; when set, nginx sends the files (X-Accel-Redirect)
+ARTIFACT_ACCEL_PREFIX = os.getenv("ARTIFACT_ACCEL_PREFIX", "")
+
+# Unfinished writes older than this are leftovers of an interrupted process
+STALE_PART_SECONDS = 3600
+
+# Seconds between sweeps for expired artifacts when nothing new is written
+ARTIFACT_SWEEP_INTERVAL = 300
+
+# Lock file serializing evictions across the processes sharing the directory
+LOCK_FILE = ".lock"
+
+
+class ArtifactStore:
+    """
+    Generated artifacts on disk, one file per content key (<key>.mp4 or <key>.json).
+
+    The directory itself is the index, so every worker process sees the same artifacts:
+    a file's mtime is its last use (reads touch it) and a missing file is a miss. After
+    each write, and every ARTIFACT_SWEEP_INTERVAL otherwise, the directory is scanned
+    under an exclusive file lock: artifacts unused for longer than the maximum age are
+    deleted, then the least recently used ones until the directory fits its quota. New
+    files are written to a .part file and renamed into place, so readers never see a
+    partial artifact.
+    """
+
+    EXTENSIONS = (".mp4", ".json")
+
+    def __init__(self, directory=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES, max_age=ARTIFACT_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._created = False
+        self._swept_at = 0.0
+
+    def _ensure_directory(self):
+        if not self._created:
+            os.makedirs(self.directory, exist_ok=True)
+            self._created = True
+
+    def path_for(self, key, extension=".mp4"):
+        return os.path.join(self.directory, key + extension)
+
+    def temp_path_for(self, key):
+        """Path to write a new artifact to before it is added under its key"""
+        self._ensure_directory()
+        return os.path.join(self.directory, f"{key}.{os.urandom(4).hex()}.part")
+
+    def get(self, key):
+        """Path of a stored video, or the stored JSON answer, for a key (None if absent or expired)"""
+        now = time.time()
+        if now - self._swept_at > ARTIFACT_SWEEP_INTERVAL:
+            self.sweep()
+
+        for extension in self.EXTENSIONS:
+            path = self.path_for(key, extension)
+            try:
+                used_at = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if self.max_age and now - used_at > self.max_age:
+                _remove(path)
+                return None
+
+            try:
+                os.utime(path)
+                if extension == ".json":
+                    with open(path) as f:
+                        return {"json_response": json.load(f)}
+                return {"video_path": path}
+            except FileNotFoundError:
+                # Evicted by another process since the stat
+                return None
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable artifact {os.path.basename(path)}: {e}")
+                _remove(path)
+                return None
+        return None
+
+    def add_file(self, key, temp_path):
+        """Move a completely written video into the store, returns its final path"""
+        path = self.path_for(key)
+        os.replace(temp_path, path)
+        self.sweep(keep=os.path.basename(path))
+        return path
+
+    def add_json(self, key, payload):
+        path = self.path_for(key, ".json")
+        temp_path = self.temp_path_for(key)
+        with open(temp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(temp_path, path)
+        self.sweep(keep=os.path.basename(path))
+
+    def _scan(self, now):
+        """(last use, name, size) of the stored artifacts, least recently used first; drops stale .part files"""
+        files = []
+        for entry in os.scandir(self.directory):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                # Removed by another process while scanning
+                continue
+            if entry.name.endswith(self.EXTENSIONS):
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+            elif entry.name.endswith(".part") and now - stat.st_mtime > STALE_PART_SECONDS:
+                _remove(entry.path)
+        files.sort()
+        return files
+
+    def sweep(self, keep=None):
+        """Delete expired artifacts, then the least recently used ones beyond the quota (never `keep`)"""
+        self._ensure_directory()
+        now = time.time()
+        self._swept_at = now
+        evicted = 0
+        try:
+            # One process evicts at a time, the others wait and then see its result
+            with open(os.path.join(self.directory, LOCK_FILE), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                files = self._scan(now)
+                total = sum(size for _, _, size in files)
+                for used_at, name, size in files:
+                    expired = self.max_age and now - used_at > self.max_age
+                    if not expired and total <= self.max_bytes:
+                        break
+                    if name == keep:
+                        continue
+                    _remove(os.path.join(self.directory, name))
+                    total -= size
+                    evicted += 1
+        except OSError as e:
+            logger.error(f"Failed to sweep {self.directory}: {e}")
+        if evicted:
+            logger.info(f"Evicted {evicted} artifacts from {self.directory}")
+
+    def stats(self):
+        self._ensure_directory()
+        files = self._scan(time.time())
+        return {"files": len(files), "bytes": sum(size for _, _, size in files), "max_bytes": self.max_bytes}
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def serve_artifact(path, mimetype="video/mp4", download_name=None):
+    """
+    Response sending a stored artifact, None if it was evicted in the meantime. With
+    ARTIFACT_ACCEL_PREFIX set nginx sends the file itself; otherwise it is served with
+    Range and conditional request support.
+    """
+    if ARTIFACT_ACCEL_PREFIX:
+        if not os.path.exists(path):
+            return None
+        headers = {"X-Accel-Redirect": ARTIFACT_ACCEL_PREFIX.rstrip("/") + "/" + os.path.basename(path)}
+        if download_name:
+            headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    try:
+        # The file is opened here, evicting it afterwards does not cut the response short
+        return send_file(path, mimetype=mimetype, as_attachment=download_name is not None,
+                         download_name=download_name, conditional=True, max_age=3600)
+    except FileNotFoundError:
+        return None
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,445 @@
+"""
+ASGI variant of the trends API (/api/trends and /api/generate-video), with the same
+JSON contracts as the Flask routes, for holding many concurrent slow requests in one
+process. MongoDB is read through motor, Gemini through its async client and the video
+API through httpx, so a waiting request costs a coroutine instead of a thread.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import datetime
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import httpx
+import google.generativeai as genai
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse, FileResponse
+from starlette.routing import Route
+from dotenv import load_dotenv
+from db_service import serialize_timestamp
+from trends_cache import (TrendsEntry, normalize_fields, cache_requests, TRENDS_POLL_INTERVAL, TRENDS_CACHE_DOMAINS,
+                          FIELD_NAME_PATTERN, MAX_FIELDS)
+from admission import (AdmissionRejected, admission_rejections, VIDEO_MAX_CONCURRENT, VIDEO_MAX_QUEUE,
+                       VIDEO_QUEUE_TIMEOUT, VIDEO_RATE_PER_MINUTE, VIDEO_RATE_BURST, DEFAULT_RETRY_AFTER, TokenBuckets,
+                       forwarded_client)
+from generation_cache import prompt_cache, prompt_cache_key, video_cache, generation_cache_requests
+from http_client import (upstream_latency, upstream_errors, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT,
+                         UPSTREAM_POOL_SIZE, UPSTREAM_RETRIES)
+from prompt_builder import get_trend_context, build_video_prompt_request
+from single_flight import coalesced_requests
+from metrics import render_prometheus
+from video_service import (GEMINI_VIDEO_MODEL, VIDEO_PROMPT_CONFIG, VIDEO_API_URL, VIDEO_STREAM_TEE, STREAM_CHUNK_SIZE,
+                           extract_video_params, build_video_payload, video_download_name, record_gemini_usage,
+                           pipeline_stages)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+
+
+class AsyncTrendsStore:
+    """
+    Latest trends documents for the event loop: an LRU of TrendsEntry keyed by
+    (domain, fields) like TrendsCache, with concurrent misses sharing one motor query,
+    kept current by a change stream task (or polling where change streams are unsupported).
+    """
+
+    def __init__(self, max_entries=TRENDS_CACHE_DOMAINS):
+        self.max_entries = max_entries
+        self.collection = None
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._high_water = None
+        self._task = None
+
+    async def _fetch(self, domain=None, fields=None):
+        """Same query and serialization as db_service.get_latest_trends_data"""
+        try:
+            document = await self.collection.find_one(
+                {"domain": domain} if domain else {},
+                {field: 1 for field in fields} if fields else {"platform_data": 0},
+                sort=[("timestamp", -1)]
+            )
+            if not document:
+                return {}
+            if "_id" in document:
+                document["_id"] = str(document["_id"])
+            if "timestamp" in document:
+                document["timestamp"] = serialize_timestamp(document["timestamp"])
+            return document
+        except Exception as e:
+            logger.error(f"Error retrieving trend data: {e}")
+            return None
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def refresh(self, domain=None, fields=None):
+        document = await self._fetch(domain, fields)
+        if document is None:
+            return None
+        # Compressing the variants is CPU work, keep it off the event loop
+        entry = await run_in_threadpool(TrendsEntry, document, fields)
+        key = (domain, fields)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def get_entry(self, domain=None, fields=None):
+        key = (domain, fields)
+        entry = self._lookup(key) or (self._lookup((domain, None)) if fields is not None else None)
+        if entry is not None:
+            cache_requests.inc(result="hit")
+            return entry
+
+        cache_requests.inc(result="miss")
+        flight = self._flights.get(key)
+        if flight is not None:
+            coalesced_requests.inc(group="asgi_trends")
+            return await asyncio.shield(flight)
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            entry = await self.refresh(domain, fields)
+            flight.set_result(entry)
+            return entry
+        except Exception as e:
+            flight.set_exception(e)
+            # Retrieved here so an exception without waiters is not reported as unhandled
+            flight.exception()
+            raise
+        finally:
+            del self._flights[key]
+
+    async def on_new_analysis(self, domain):
+        for key in [key for key in self._entries if key[0] is None or key[0] == domain]:
+            await self.refresh(*key)
+
+    def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _watch(self):
+        pipeline = [
+            {"$match": {"operationType": "insert"}},
+            {"$project": {"fullDocument.timestamp": 1, "fullDocument.domain": 1}}
+        ]
+        try:
+            async with self.collection.watch(pipeline) as stream:
+                logger.info("Watching trends collection through a change stream")
+                for key in list(self._entries):
+                    await self.refresh(*key)
+                async for change in stream:
+                    await self.on_new_analysis(change.get("fullDocument", {}).get("domain"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Change stream unavailable, polling every {TRENDS_POLL_INTERVAL}s instead: {e}")
+
+        while True:
+            try:
+                query = {"timestamp": {"$gt": self._high_water}} if self._high_water is not None else {}
+                cursor = self.collection.find(query, {"domain": 1, "timestamp": 1, "_id": 0}).sort("timestamp", -1)
+                markers = await cursor.to_list(100 if self._high_water is not None else 1)
+                if markers:
+                    first_check = self._high_water is None
+                    self._high_water = markers[0]["timestamp"]
+                    if first_check:
+                        for key in list(self._entries):
+                            await self.refresh(*key)
+                    else:
+                        for domain in {marker.get("domain") for marker in markers}:
+                            await self.on_new_analysis(domain)
+            except Exception as e:
+                logger.error(f"Error checking for new trend data: {e}")
+            await asyncio.sleep(TRENDS_POLL_INTERVAL)
+
+
+class AsyncAdmissionController:
+    """Concurrency cap, bounded wait queue and per-client rate limit of admission.AdmissionController, for coroutines"""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, rate_per_minute, burst):
+        self.name = name
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.buckets = TokenBuckets(rate_per_minute / 60, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+
+    def _reject(self, reason, retry_after):
+        admission_rejections.inc(limiter=self.name, reason=reason)
+        raise AdmissionRejected(reason, retry_after)
+
+    async def acquire(self, client_id):
+        wait = self.buckets.take(client_id)
+        if wait:
+            self._reject("rate_limited", wait)
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.buckets.refund(client_id)
+            self._reject("queue_full", DEFAULT_RETRY_AFTER)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.buckets.refund(client_id)
+            self._reject("queue_timeout", DEFAULT_RETRY_AFTER)
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+
+trends_store = AsyncTrendsStore()
+video_admission = AsyncAdmissionController("video_async", VIDEO_MAX_CONCURRENT, VIDEO_MAX_QUEUE, VIDEO_QUEUE_TIMEOUT,
+                                           VIDEO_RATE_PER_MINUTE, VIDEO_RATE_BURST)
+http_client = None
+
+
+def error(message, status):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def client_id(request):
+    """Client address, as forwarded by nginx when behind the proxy"""
+    return forwarded_client(request.client.host if request.client else None, request.headers.get("x-real-ip"))
+
+
+async def get_latest_trends(request):
+    """Same contract as the Flask /api/trends route"""
+    try:
+        domain = request.query_params.get("domain", "").strip() or None
+        fields = None
+        if request.query_params.get("fields"):
+            fields = [field.strip() for field in request.query_params["fields"].split(",") if field.strip()]
+            if not all(FIELD_NAME_PATTERN.match(field) for field in fields) or len(fields) > MAX_FIELDS:
+                return error("fields must be a comma-separated list of top-level field names", 400)
+
+        fields = normalize_fields(fields)
+        entry = await trends_store.get_entry(domain, fields)
+        if entry is None:
+            return error("Database connection not available", 500)
+
+        latest_trend, prepared = entry.variant(fields)
+        if latest_trend == {}:
+            return error(f"No trend data available{' for domain: ' + domain if domain else ''}", 404)
+
+        status, headers, body = prepared.negotiate(request.headers.get("accept-encoding"),
+                                                   request.headers.get("if-none-match"))
+        return Response(body, status_code=status, headers=headers,
+                        media_type="application/json" if status == 200 else None)
+
+    except Exception as e:
+        logger.error(f"Error retrieving trend data: {e}")
+        return error(f"Failed to retrieve trend data: {str(e)}", 500)
+
+
+async def generate_video_prompt_async(form_data, trends_data):
+    """generate_video_prompt with the async Gemini client and an async prompt cache lookup"""
+    try:
+        prompts = trends_store.collection.database["prompt_cache"]
+        cache_key = prompt_cache_key(form_data, trends_data)
+        cached_prompt = prompt_cache.get_local(cache_key)
+        if cached_prompt is None:
+            document = await prompts.find_one({"_id": cache_key})
+            if document:
+                cached_prompt = document["prompt"]
+                prompt_cache.remember(cache_key, cached_prompt)
+        generation_cache_requests.inc(cache="prompt", result="hit" if cached_prompt is not None else "miss")
+        if cached_prompt is not None:
+            return cached_prompt
+
+        model = genai.GenerativeModel(GEMINI_VIDEO_MODEL)
+        prompt = build_video_prompt_request(form_data, get_trend_context(trends_data))
+
+        start = time.perf_counter()
+        response = await model.generate_content_async(prompt, generation_config=VIDEO_PROMPT_CONFIG)
+        record_gemini_usage(response, time.perf_counter() - start, "video_prompt")
+        video_prompt = json.loads(response.text)["video_prompt"].strip()
+
+        prompt_cache.remember(cache_key, video_prompt)
+        await prompts.replace_one(
+            {"_id": cache_key},
+            {"_id": cache_key, "prompt": video_prompt, "created_at": datetime.datetime.utcnow()},
+            upsert=True
+        )
+        return video_prompt
+
+    except Exception as e:
+        logger.error(f"Error generating video prompt: {e}")
+        return None
+
+
+async def relay_video(response, cache_key):
+    """
+    Yield upstream chunks as they arrive, teeing them into the video cache. When the
+    client disconnects the generator is cancelled and the upstream request closed.
+    """
+    temp_path = await run_in_threadpool(video_cache.temp_path_for, cache_key) if VIDEO_STREAM_TEE else None
+    file = await run_in_threadpool(open, temp_path, "wb") if temp_path else None
+    complete = False
+    try:
+        async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+            if file is not None:
+                await run_in_threadpool(file.write, chunk)
+            yield chunk
+        complete = True
+    finally:
+        await response.aclose()
+        if file is not None:
+            await run_in_threadpool(file.close)
+            if complete:
+                await run_in_threadpool(video_cache.put_file, cache_key, temp_path)
+            else:
+                await run_in_threadpool(os.remove, temp_path)
+
+
+def video_json_response(json_response, video_prompt):
+    return JSONResponse({"success": True, "videoUrl": json_response.get("videoUrl"), "prompt": video_prompt})
+
+
+async def generate_video(request):
+    """Same contract as the Flask /api/generate-video route, always relaying video answers"""
+    try:
+        form_data = await request.json()
+    except ValueError:
+        form_data = None
+    if not form_data or not all(k in form_data for k in ["productName", "description", "scenes"]):
+        return error("Missing required fields", 400)
+
+    try:
+        await video_admission.acquire(client_id(request))
+    except AdmissionRejected as rejection:
+        return JSONResponse({"error": "Server is busy, try again later", "reason": rejection.reason,
+                             "retryAfter": rejection.retry_after},
+                            status_code=429, headers={"Retry-After": str(rejection.retry_after)})
+
+    released = False
+    try:
+        entry = await trends_store.get_entry()
+        trends_data = entry.document if entry is not None else None
+        if not trends_data:
+            return error("Could not retrieve trends data", 500)
+
+        start = time.perf_counter()
+        video_prompt = await generate_video_prompt_async(form_data, trends_data)
+        pipeline_stages.observe(time.perf_counter() - start, stage="prompt")
+        if not video_prompt:
+            return error("Failed to generate video prompt", 500)
+
+        payload = build_video_payload(video_prompt, **extract_video_params(form_data))
+        cache_key = video_cache.key(payload)
+        cached = await run_in_threadpool(video_cache.get, cache_key)
+        if cached is not None and "video_path" in cached:
+            if not await run_in_threadpool(os.path.isfile, cached["video_path"]):
+                cached = None
+        if cached is not None:
+            if "video_path" in cached:
+                return FileResponse(cached["video_path"], media_type="video/mp4",
+                                    filename=video_download_name(video_prompt))
+            return video_json_response(cached["json_response"], video_prompt)
+
+        host = httpx.URL(VIDEO_API_URL).netloc.decode()
+        start = time.perf_counter()
+        try:
+            upstream = await http_client.send(http_client.build_request("POST", VIDEO_API_URL, json=payload),
+                                              stream=True)
+        except httpx.HTTPError as e:
+            upstream_latency.observe(time.perf_counter() - start, host=host, status="error")
+            upstream_errors.inc(host=host, error=type(e).__name__)
+            logger.error(f"Error calling video generation API: {e}")
+            return error("Failed to generate video", 500)
+        upstream_latency.observe(time.perf_counter() - start, host=host, status=str(upstream.status_code))
+
+        content_type = upstream.headers.get("content-type", "")
+        if upstream.status_code >= 400 or not ("application/json" in content_type or "video/mp4" in content_type):
+            await upstream.aclose()
+            if upstream.status_code >= 500:
+                upstream_errors.inc(host=host, error=f"http_{upstream.status_code}")
+            logger.error(f"Video generation API answered {upstream.status_code} ({content_type})")
+            return error("Failed to generate video", 500)
+
+        if "application/json" in content_type:
+            json_response = json.loads(await upstream.aread())
+            await upstream.aclose()
+            await run_in_threadpool(video_cache.put_json, cache_key, json_response)
+            return video_json_response(json_response, video_prompt)
+
+        headers = {
+            "Content-Disposition": f'attachment; filename="{video_download_name(video_prompt)}"',
+            "X-Accel-Buffering": "no"
+        }
+        if upstream.headers.get("content-length") and not upstream.headers.get("content-encoding"):
+            headers["Content-Length"] = upstream.headers["content-length"]
+
+        async def stream():
+            try:
+                async for chunk in relay_video(upstream, cache_key):
+                    yield chunk
+            finally:
+                video_admission.release()
+
+        released = True
+        return StreamingResponse(stream(), media_type="video/mp4", headers=headers)
+
+    except Exception as e:
+        logger.error(f"Error in video generation process: {e}")
+        return error(f"Video generation failed: {str(e)}", 500)
+    finally:
+        if not released:
+            video_admission.release()
+
+
+async def prometheus_metrics(request):
+    return Response(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global http_client
+    mongo_client = AsyncIOMotorClient(MONGO_URI)
+    trends_store.collection = mongo_client["PixelFlowLabs"]["trends"]
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=UPSTREAM_POOL_SIZE, max_keepalive_connections=UPSTREAM_POOL_SIZE),
+        # httpx retries failed connection attempts only, so a render request is never sent twice
+        transport=httpx.AsyncHTTPTransport(retries=UPSTREAM_RETRIES)
+    )
+    trends_store.start()
+    logger.info("ASGI trends API started")
+    try:
+        yield
+    finally:
+        await trends_store.stop()
+        await http_client.aclose()
+        mongo_client.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/trends", get_latest_trends, methods=["GET"]),
+        Route("/api/generate-video", generate_video, methods=["POST"]),
+        Route("/metrics", prometheus_metrics, methods=["GET"])
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan
+)
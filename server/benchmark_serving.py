@@ -0,0 +1,162 @@
+"""
+Throughput comparison of the development server, gunicorn and the ASGI variant of the trends API.
+
+Starts each server configuration on its own port against the same MongoDB
+(MONGO_URI), waits until it answers, then runs closed-loop clients (each sends its
+next request as soon as the previous one finished) for a fixed duration at every
+concurrency level, and prints requests/second and latency percentiles:
+
+    cd server
+    python benchmark_serving.py --path /api/trends --concurrency 1,8,32,64 --duration 15
+
+Configurations (pick with --servers):
+- dev: `python app.py`, the Werkzeug development server (threaded)
+- gthread: gunicorn with GUNICORN_WORKERS x GUNICORN_THREADS threads
+- gevent: gunicorn with gevent workers
+- asgi: asgi_app:app (Starlette + motor + httpx) on a single uvicorn process
+
+--idle-streams N keeps N /api/trends/stream (SSE) connections open while measuring,
+as browsers with the dashboard open do; each holds a thread under gthread workers.
+
+High --concurrency values (hundreds to thousands of clients) show how many concurrent
+connections each configuration holds before latency degrades; raise the open file
+limit (ulimit -n) for those runs.
+
+Results of the last recorded run are in BENCHMARKS.md. Numbers depend on the machine,
+the worker settings in the environment and where MongoDB runs, so compare configurations
+from the same run. Run it on hardware close to production and keep the load generator
+on a different core set (or machine) than the server when possible, since both compete
+for the CPU otherwise.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    "dev": lambda port: ([sys.executable, "app.py"], {"PORT": str(port)}),
+    "gthread": lambda port: ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                             {"GUNICORN_BIND": f"127.0.0.1:{port}", "GUNICORN_WORKER_CLASS": "gthread",
+                              "GUNICORN_ACCESS_LOG": ""}),
+    "gevent": lambda port: ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                            {"GUNICORN_BIND": f"127.0.0.1:{port}", "GUNICORN_WORKER_CLASS": "gevent",
+                             "GUNICORN_ACCESS_LOG": ""}),
+    "asgi": lambda port: ([sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1",
+                           "--port", str(port), "--log-level", "warning", "--no-access-log"], {})
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def wait_until_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=2)
+            return True
+        except requests.RequestException:
+            time.sleep(0.5)
+    return False
+
+
+def open_idle_streams(port, count, path="/api/trends/stream"):
+    """Open `count` SSE connections that stay idle until closed, returns their sockets"""
+    streams = []
+    for _ in range(count):
+        stream = socket.create_connection(("127.0.0.1", port), timeout=10)
+        stream.sendall(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n".encode())
+        streams.append(stream)
+    return streams
+
+
+def run_load(url, concurrency, duration):
+    """Closed-loop load: `concurrency` clients with keep-alive sessions, for `duration` seconds"""
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=30, headers={"Accept-Encoding": "gzip, br"})
+                response.content
+                if response.status_code >= 500:
+                    errors[index] += 1
+                    continue
+            except requests.RequestException:
+                errors[index] += 1
+                continue
+            latencies[index].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = sorted(latency for client_latencies in latencies for latency in client_latencies)
+    return {
+        "requests_per_second": len(merged) / elapsed,
+        "p50_ms": percentile(merged, 0.50) * 1000,
+        "p95_ms": percentile(merged, 0.95) * 1000,
+        "p99_ms": percentile(merged, 0.99) * 1000,
+        "errors": sum(errors)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", default="dev,gthread,gevent,asgi", help="comma-separated configurations")
+    parser.add_argument("--path", default="/api/trends", help="endpoint to load")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per concurrency level")
+    parser.add_argument("--port", type=int, default=5100, help="first port to use")
+    parser.add_argument("--idle-streams", type=int, default=0, help="SSE connections held open during the load")
+    args = parser.parse_args()
+
+    print("| server | clients | req/s | p50 ms | p95 ms | p99 ms | errors |")
+    print("|---|---|---|---|---|---|---|")
+    for offset, name in enumerate(args.servers.split(",")):
+        port = args.port + offset
+        command, env = SERVERS[name](port)
+        process = subprocess.Popen(command, cwd=SERVER_DIR, env={**os.environ, **env},
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        streams = []
+        try:
+            url = f"http://127.0.0.1:{port}{args.path}"
+            if not wait_until_ready(url):
+                print(f"| {name} | - | server did not start | | | | |")
+                continue
+            streams = open_idle_streams(port, args.idle_streams)
+            # Warm caches and connections before measuring
+            run_load(url, 2, 1)
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                result = run_load(url, concurrency, args.duration)
+                print(f"| {name} | {concurrency} | {result['requests_per_second']:.0f} | {result['p50_ms']:.1f} | "
+                      f"{result['p95_ms']:.1f} | {result['p99_ms']:.1f} | {result['errors']} |", flush=True)
+        finally:
+            for stream in streams:
+                stream.close()
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 import os
+import sys
+import datetime
 import logging
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
 from dotenv import load_dotenv
 
 # Ensure environment variables are loaded
 load_dotenv()
 
+# Directory of the trend job, whose trend_indexes module both processes use (a sibling of server/)
+TREND_JOB_DIR = os.getenv("TREND_JOB_DIR",
+                          os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "trend_job"))
+if TREND_JOB_DIR not in sys.path:
+    sys.path.append(TREND_JOB_DIR)
+
+from trend_indexes import ensure_trend_indexes, verify_trend_index_usage
+
 logger = logging.getLogger(__name__)
 
+# Seconds a cached video prompt is kept in the prompt_cache collection
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", str(7 * 24 * 3600)))
+
 # Initialize MongoDB variables
 client = None
 db = None
@@ -23,15 +36,43 @@ def initialize_db():
         db = client["PixelFlowLabs"]
         collection = db["trends"]
         logger.info("Successfully connected to MongoDB")
+        ensure_indexes()
         return True
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         client = None
         return False
 
-def get_latest_trends_data():
+def ensure_indexes():
+    """
+    Create the indexes the server reads and writes by. The trends indexes are shared with
+    the trend job (trend_job/trend_indexes.py), the server cannot rely on it running first.
+    """
+    ensure_trend_indexes(db)
+    verify_trend_index_usage(db)
+    try:
+        # Heartbeats and recovery look up video jobs by state and owner / heartbeat time
+        db["video_jobs"].create_index([("state", ASCENDING), ("heartbeat_at", ASCENDING)], name="state_heartbeat_at")
+        db["video_jobs"].create_index([("owner", ASCENDING), ("state", ASCENDING)], name="owner_state")
+        # Cached prompts refer to a trends snapshot, expire them once it is long superseded
+        db["prompt_cache"].create_index("created_at", name="created_at_ttl", expireAfterSeconds=PROMPT_CACHE_TTL)
+        logger.info("Ensured indexes on the video_jobs and prompt_cache collections")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to create indexes on the video_jobs and prompt_cache collections: {e}")
+        return False
+
+def serialize_timestamp(timestamp):
+    """API responses keep ISO strings, whether the document stores a datetime or a legacy string"""
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.isoformat()
+    return timestamp
+
+def get_latest_trends_data(domain=None, fields=None):
     """
-    Function to get the latest trends data from the database
+    Function to get the latest trends data from the database,
+    optionally the latest analysis of one domain (uses the (domain, timestamp) index)
+    and only the given top-level fields
     """
     try:
         if not client:
@@ -39,20 +80,147 @@ def get_latest_trends_data():
             return None
 
         latest_trend = collection.find_one(
-            {},  # empty query to match all documents
-            {"platform_data": 0},  # exclude platform_data field
+            {"domain": domain} if domain else {},  # match all documents unless a domain is given
+            {field: 1 for field in fields} if fields else {"platform_data": 0},  # never include platform_data
             sort=[("timestamp", -1)]  # sort by timestamp in descending order
         )
 
         if not latest_trend:
-            logger.error("No trend data available")
+            logger.error(f"No trend data available{' for domain: ' + domain if domain else ''}")
             return {}
 
-        # Convert ObjectId to string
+        # Convert ObjectId and datetime to strings
         if "_id" in latest_trend:
             latest_trend["_id"] = str(latest_trend["_id"])
+        if "timestamp" in latest_trend:
+            latest_trend["timestamp"] = serialize_timestamp(latest_trend["timestamp"])
             
         return latest_trend
     except Exception as e:
         logger.error(f"Error retrieving trend data: {e}")
         return None
+
+def get_trend_markers_since(after=None, limit=100):
+    """
+    Cheap check for new analyses: (domain, timestamp) of documents newer than `after`,
+    newest first. Without `after` only the newest document is returned. None if unavailable.
+    """
+    try:
+        if not client:
+            return None
+
+        query = {"timestamp": {"$gt": after}} if after is not None else {}
+        cursor = collection.find(query, {"domain": 1, "timestamp": 1, "_id": 0}).sort("timestamp", -1)
+        return list(cursor.limit(limit if after is not None else 1))
+    except Exception as e:
+        logger.error(f"Error checking for new trend data: {e}")
+        return None
+
+def watch_trend_inserts():
+    """
+    Open a change stream on the trends collection that reports newly inserted analyses.
+    Raises pymongo errors if change streams are not supported (e.g. standalone mongod).
+    """
+    if not client:
+        raise ConnectionError("Database connection not available")
+
+    pipeline = [
+        {"$match": {"operationType": "insert"}},
+        {"$project": {"fullDocument.timestamp": 1, "fullDocument.domain": 1}}
+    ]
+    return collection.watch(pipeline, max_await_time_ms=1000)
+
+# Bucket sizes and the $dateToString formats that truncate timestamps to them
+HISTORY_BUCKETS = {
+    "hour": (datetime.timedelta(hours=1), "%Y-%m-%dT%H:00:00"),
+    "day": (datetime.timedelta(days=1), "%Y-%m-%dT00:00:00")
+}
+
+def truncate_to_bucket(timestamp, bucket):
+    """Floor a datetime to the start of its hour/day bucket"""
+    if bucket == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def get_trends_history(start, end, bucket="hour", domain=None, limit=48):
+    """
+    Summaries of the analyses between start and end, aggregated per hour/day bucket by MongoDB.
+
+    Pages are fixed time windows of `limit` buckets starting at `start`, so every page is a
+    bounded index range scan. Buckets are aligned to the hour/day, but only analyses from
+    `start` on are counted, so the first bucket is partial when `start` falls inside it.
+    Returns (buckets, next_cursor) where next_cursor is the start of the next bucket holding
+    data, or (None, None) if the database is unavailable.
+    """
+    try:
+        if not client:
+            logger.error("Database connection not available")
+            return None, None
+
+        bucket_size, bucket_format = HISTORY_BUCKETS[bucket]
+        page_start = truncate_to_bucket(start, bucket)
+        page_end = min(end, page_start + bucket_size * limit)
+
+        # Buckets stay aligned, the first one only holds analyses from `start` on
+        match = {"timestamp": {"$gte": max(start, page_start), "$lt": page_end}}
+        if domain:
+            match["domain"] = domain
+
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"timestamp": 1}},
+            # Only the summary fields leave the index/document fetch, never platform_data
+            {"$project": {
+                "_id": 0,
+                "timestamp": 1,
+                "top_hashtags": 1,
+                "top_words": 1,
+                "overall_mood": "$sentiment.overall_mood",
+                "polarity": "$sentiment.data.textblob.avg_polarity",
+                "positive_percentage": "$sentiment.data.transformer.positive_percentage"
+            }},
+            {"$group": {
+                "_id": {"$dateToString": {"format": bucket_format, "date": "$timestamp"}},
+                "documents": {"$sum": 1},
+                "avg_polarity": {"$avg": "$polarity"},
+                "avg_positive_percentage": {"$avg": "$positive_percentage"},
+                "latest_timestamp": {"$last": "$timestamp"},
+                "overall_mood": {"$last": "$overall_mood"},
+                "top_hashtags": {"$last": "$top_hashtags"},
+                "top_words": {"$last": "$top_words"}
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+
+        buckets = []
+        for row in collection.aggregate(pipeline):
+            row["bucket"] = row.pop("_id")
+            row["latest_timestamp"] = serialize_timestamp(row["latest_timestamp"])
+            buckets.append(row)
+
+        # The next page starts at the first bucket with data, skipping empty stretches
+        next_cursor = None
+        if page_end < end:
+            next_query = {"timestamp": {"$gte": page_end, "$lt": end}}
+            if domain:
+                next_query["domain"] = domain
+            next_doc = collection.find_one(next_query, {"timestamp": 1, "_id": 0}, sort=[("timestamp", 1)])
+            if next_doc:
+                next_cursor = truncate_to_bucket(next_doc["timestamp"], bucket).isoformat()
+
+        return buckets, next_cursor
+    except Exception as e:
+        logger.error(f"Error retrieving trend history: {e}")
+        return None, None
+
+def get_video_jobs_collection():
+    """Collection persisting video generation jobs (None if the database is unavailable)"""
+    if not client:
+        return None
+    return db["video_jobs"]
+
+def get_prompt_cache_collection():
+    """Collection caching generated video prompts (None if the database is unavailable)"""
+    if not client:
+        return None
+    return db["prompt_cache"]
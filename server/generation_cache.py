@@ -0,0 +1,161 @@
+import os
+import json
+import datetime
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pymongo import ReplaceOne
+from db_service import get_prompt_cache_collection
+from artifact_store import artifact_store
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Number of generated prompts kept in memory in front of the prompt_cache collection
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+
+# Form fields that determine the generated prompt (together with the trends document)
+PROMPT_KEY_FIELDS = ("productName", "description", "scenes")
+
+generation_cache_requests = Counter("generation_cache_requests_total",
+                                    "Prompt and video cache lookups by cache and result (hit/miss)")
+
+
+def content_key(*parts):
+    """SHA-256 of the canonical JSON encoding of `parts`"""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def prompt_cache_key(form_data, trends_data):
+    """Key of a generated prompt: the product form fields and the trends snapshot it was built from"""
+    trends_id = trends_data.get("_id") or content_key(trends_data)
+    return content_key({field: form_data.get(field) for field in PROMPT_KEY_FIELDS}, trends_id)
+
+
+class PromptCache:
+    """
+    Generated prompts by content key, in an in-memory LRU backed by the prompt_cache
+    collection so other server processes and restarts reuse them too.
+    """
+
+    def __init__(self, max_entries=PROMPT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def remember(self, key, prompt):
+        """Keep a prompt in the in-memory LRU only"""
+        with self._lock:
+            self._entries[key] = prompt
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_local(self, key):
+        """Prompt from the in-memory LRU only (None on a miss)"""
+        with self._lock:
+            prompt = self._entries.get(key)
+            if prompt is not None:
+                self._entries.move_to_end(key)
+            return prompt
+
+    def get(self, key):
+        prompt = self.get_local(key)
+        if prompt is None:
+            try:
+                collection = get_prompt_cache_collection()
+                document = collection.find_one({"_id": key}) if collection is not None else None
+                if document:
+                    prompt = document["prompt"]
+                    self.remember(key, prompt)
+            except Exception as e:
+                logger.error(f"Error reading the prompt cache: {e}")
+
+        generation_cache_requests.inc(cache="prompt", result="hit" if prompt is not None else "miss")
+        return prompt
+
+    def get_many(self, keys):
+        """Prompts of several keys as a dict (misses left out), one database query for all local misses"""
+        prompts = {}
+        for key in keys:
+            prompt = self.get_local(key)
+            if prompt is not None:
+                prompts[key] = prompt
+
+        missing = list({key for key in keys if key not in prompts})
+        if missing:
+            try:
+                collection = get_prompt_cache_collection()
+                documents = collection.find({"_id": {"$in": missing}}) if collection is not None else []
+                for document in documents:
+                    prompts[document["_id"]] = document["prompt"]
+                    self.remember(document["_id"], document["prompt"])
+            except Exception as e:
+                logger.error(f"Error reading the prompt cache: {e}")
+
+        hits = sum(1 for key in keys if key in prompts)
+        generation_cache_requests.inc(hits, cache="prompt", result="hit")
+        generation_cache_requests.inc(len(keys) - hits, cache="prompt", result="miss")
+        return prompts
+
+    def put_many(self, prompts):
+        """Store several prompts (a dict of key to prompt) with one bulk write"""
+        for key, prompt in prompts.items():
+            self.remember(key, prompt)
+        try:
+            collection = get_prompt_cache_collection()
+            if collection is not None and prompts:
+                now = datetime.datetime.utcnow()
+                collection.bulk_write([
+                    ReplaceOne({"_id": key}, {"_id": key, "prompt": prompt, "created_at": now}, upsert=True)
+                    for key, prompt in prompts.items()
+                ], ordered=False)
+        except Exception as e:
+            logger.error(f"Error writing the prompt cache: {e}")
+
+    def put(self, key, prompt):
+        self.remember(key, prompt)
+        try:
+            collection = get_prompt_cache_collection()
+            if collection is not None:
+                document = {"_id": key, "prompt": prompt, "created_at": datetime.datetime.utcnow()}
+                collection.replace_one({"_id": key}, document, upsert=True)
+        except Exception as e:
+            logger.error(f"Error writing the prompt cache: {e}")
+
+
+class VideoCache:
+    """
+    Generated videos (or the JSON answer of the video API) by the request that produced them.
+    The files are kept in the artifact store, which manages their disk quota and expiry.
+    """
+
+    def __init__(self, store=artifact_store):
+        self.store = store
+
+    def key(self, payload):
+        """Key of a generated video: the video API request (prompt and generation parameters)"""
+        return content_key(payload)
+
+    def get(self, key):
+        """{'video_path': ...} or {'json_response': ...} for a key, None on a miss"""
+        cached = self.store.get(key)
+        generation_cache_requests.inc(cache="video", result="hit" if cached is not None else "miss")
+        return cached
+
+    def temp_path_for(self, key):
+        """Path to write a new video to before it is added with put_file"""
+        return self.store.temp_path_for(key)
+
+    def put_file(self, key, temp_path):
+        """Move a completely written video into the cache, returns its final path"""
+        return self.store.add_file(key, temp_path)
+
+    def put_json(self, key, answer):
+        self.store.add_json(key, answer)
+
+
+prompt_cache = PromptCache()
+video_cache = VideoCache()
@@ -0,0 +1,63 @@
+"""
+Gunicorn settings for the trends API, all overridable through the environment.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Worker classes:
+- gevent (default): one greenlet per connection (up to GUNICORN_WORKER_CONNECTIONS per
+  worker), so open SSE streams and slow video relays do not use up the workers.
+- gthread: WORKERS processes x THREADS threads. Each open SSE stream or video relay
+  holds a thread, so size THREADS for the expected concurrent streams.
+
+Reloading: `kill -HUP <master>` replaces the workers gracefully (each finishes its
+in-flight requests within GUNICORN_GRACEFUL_TIMEOUT). With preloading, code changes
+need `kill -USR2 <master>` (new master) followed by `kill -QUIT <old master>`.
+"""
+import os
+import multiprocessing
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+
+# gevent must patch the standard library before the app (and its locks and threads) is preloaded
+if worker_class == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+    # Gemini over REST goes through the patched sockets; gRPC only cooperates once told about gevent
+    os.environ.setdefault("GEMINI_TRANSPORT", "rest")
+    if os.environ["GEMINI_TRANSPORT"] == "grpc":
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+
+# Same port as the development server, which the client and compose setup expect
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Processes, threads per process (gthread) and connections per process (gevent)
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# Import the app once in the master, workers share its memory copy-on-write
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Seconds a worker may be silent before it is restarted, and may take to finish on reload
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then to bound memory growth, staggered so they do not restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    """MongoClient connections and background threads do not survive a fork, start them per worker"""
+    from app import start_services
+    from http_client import reset_session
+
+    reset_session()
+    start_services()
+    server.log.info(f"Worker {worker.pid} started its database connection and background services")
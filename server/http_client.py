@@ -0,0 +1,100 @@
+import os
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Seconds allowed to establish a connection to an upstream API
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+
+# Seconds allowed between two reads from an upstream API (video rendering can be slow to start)
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "600"))
+
+# Maximum open connections kept per upstream host
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "10"))
+
+# Retries of failed upstream calls, with exponential backoff and jitter
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "3"))
+UPSTREAM_BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", "0.5"))
+
+# Responses worth retrying for idempotent requests
+RETRY_STATUSES = (429, 502, 503, 504)
+
+upstream_latency = Histogram("upstream_request_duration_seconds",
+                             "Time until upstream API response headers were received, by host and status")
+upstream_errors = Counter("upstream_request_errors_total", "Failed upstream API calls by host and error type")
+
+
+def _retry_policy():
+    """
+    Connection failures are always retried (the request never reached the server).
+    Read errors and retryable statuses are only retried for idempotent methods, so a
+    POST that may already be rendering a video is never sent twice.
+    """
+    return Retry(
+        total=UPSTREAM_RETRIES,
+        connect=UPSTREAM_RETRIES,
+        read=UPSTREAM_RETRIES,
+        status=UPSTREAM_RETRIES,
+        other=0,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=UPSTREAM_BACKOFF,
+        backoff_jitter=UPSTREAM_BACKOFF,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+
+
+_session_lock = threading.Lock()
+_session = None
+
+
+def get_session():
+    """Process-wide pooled session (connections are reused across requests and threads)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=UPSTREAM_POOL_SIZE, pool_maxsize=UPSTREAM_POOL_SIZE,
+                                  pool_block=True, max_retries=_retry_policy())
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def reset_session():
+    """Drop the pooled connections, e.g. in a forked worker that must not share its parent's sockets"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def upstream_request(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the pooled session with connect/read timeouts,
+    recording its latency (to the response headers) and failures
+    """
+    host = urlsplit(url).netloc
+    start = time.perf_counter()
+    try:
+        timeout = timeout or (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT)
+        response = get_session().request(method, url, timeout=timeout, **kwargs)
+    except requests.exceptions.RequestException as e:
+        upstream_latency.observe(time.perf_counter() - start, host=host, status="error")
+        upstream_errors.inc(host=host, error=type(e).__name__)
+        raise
+
+    upstream_latency.observe(time.perf_counter() - start, host=host, status=str(response.status_code))
+    if response.status_code >= 500:
+        upstream_errors.inc(host=host, error=f"http_{response.status_code}")
+    return response
@@ -0,0 +1,165 @@
+import time
+import threading
+
+# All metrics created through this module, in creation order
+REGISTRY = []
+
+
+class _Metric:
+    """Base class for in-process metrics, one value (or histogram) per label combination"""
+
+    type_name = None
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted(labels.items()))
+
+    def samples(self):
+        """Return a list of (labels dict, value) pairs"""
+        with self._lock:
+            return [(dict(key), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed on read by a callback"""
+
+    type_name = "gauge"
+
+    def __init__(self, name, description, callback=None):
+        super().__init__(name, description)
+        self._callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self._callback is not None:
+            value = self._callback()
+            # Callbacks return one value, or (labels, value) pairs for several series
+            return list(value) if isinstance(value, list) else [({}, value)]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed, cumulative buckets"""
+
+    type_name = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][index] += 1
+            entry["count"] += 1
+            entry["sum"] += value
+
+    def time(self, **labels):
+        """Context manager that observes the duration of its block in seconds"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            return [(dict(key), {"buckets": list(entry["buckets"]), "count": entry["count"], "sum": entry["sum"]})
+                    for key, entry in self._values.items()]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def snapshot():
+    """JSON-serializable view of every registered metric"""
+    return {
+        metric.name: {
+            "type": metric.type_name,
+            "description": metric.description,
+            "samples": [{"labels": labels, "value": value} for labels, value in metric.samples()]
+        }
+        for metric in REGISTRY
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Every registered metric in the Prometheus text exposition format (0.0.4)"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        for labels, value in metric.samples():
+            if metric.type_name != "histogram":
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for bound, count in zip(metric.buckets, value["buckets"]):
+                lines.append(f"{metric.name}_bucket{_format_labels({**labels, 'le': _format_value(float(bound))})} {count}")
+            lines.append(f"{metric.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {value['count']}")
+            lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+            lines.append(f"{metric.name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,64 @@
+import json
+import gzip
+import hashlib
+from flask import Response
+from werkzeug.http import parse_accept_header, parse_etags
+
+# Brotli is optional, without it clients get gzip or identity responses
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class PreparedResponse:
+    """
+    A JSON payload serialized once, with gzip/brotli variants and a strong ETag.
+
+    Serving it is a lookup of the variant matching the request's Accept-Encoding,
+    or a 304 when the client already holds the current version.
+    """
+
+    def __init__(self, payload):
+        # Same compact, key-sorted output as Flask's jsonify
+        self.body = json.dumps(payload, separators=(",", ":"), sort_keys=True, default=str).encode("utf-8")
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.variants = {
+            "identity": self.body,
+            "gzip": gzip.compress(self.body, compresslevel=9)
+        }
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.body, quality=11)
+
+    def choose_encoding(self, accept_encoding):
+        """Best encoding we have for an Accept-Encoding header value"""
+        offered = [encoding for encoding in ("br", "gzip") if encoding in self.variants]
+        best = parse_accept_header(accept_encoding).best_match(offered)
+        return best or "identity"
+
+    def negotiate(self, accept_encoding=None, if_none_match=None):
+        """
+        (status, headers, body) for the raw Accept-Encoding and If-None-Match header values,
+        independent of the web framework
+        """
+        headers = {
+            "ETag": f'"{self.etag}"',
+            "Vary": "Accept-Encoding",
+            # Clients may keep the body but must revalidate it with If-None-Match
+            "Cache-Control": "no-cache"
+        }
+
+        if parse_etags(if_none_match).contains_weak(self.etag):
+            return 304, headers, b""
+
+        encoding = self.choose_encoding(accept_encoding)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, headers, self.variants[encoding]
+
+    def to_response(self, request):
+        status, headers, body = self.negotiate(request.headers.get("Accept-Encoding"),
+                                               request.headers.get("If-None-Match"))
+        if status == 304:
+            return Response(status=304, headers=headers)
+        return Response(body, status=status, headers=headers, mimetype="application/json")
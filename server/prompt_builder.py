@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from generation_cache import content_key
+
+# Items of each trend list included in the prompt context
+TREND_CONTEXT_ITEMS = 8
+
+# Characters of the AI trend summary included in the prompt context
+SUMMARY_CHARS = 400
+
+# Number of trend contexts kept in memory, one per trends document
+TREND_CONTEXT_CACHE_SIZE = 16
+
+# Structured output of the video prompt call
+VIDEO_PROMPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "detailed_prompt": {"type": "string"},
+        "video_prompt": {"type": "string"}
+    },
+    "required": ["detailed_prompt", "video_prompt"]
+}
+
+_contexts_lock = threading.Lock()
+_contexts = OrderedDict()
+
+
+def _join(values):
+    values = [str(value) for value in values if value][:TREND_CONTEXT_ITEMS]
+    return ", ".join(values) if values else None
+
+
+def build_trend_context(trends_data):
+    """
+    Compact, line-per-signal summary of a trends document for the prompt,
+    instead of the whole document as indented JSON
+    """
+    ai_analysis = trends_data.get("ai_analysis") or {}
+    velocity = trends_data.get("trend_velocity") or {}
+    sentiment = trends_data.get("sentiment") or {}
+
+    lines = [
+        ("Domain", trends_data.get("domain")),
+        ("Mood", sentiment.get("overall_mood")),
+        ("Hashtags", _join(trends_data.get("top_canonical_hashtags") or trends_data.get("top_hashtags") or {})),
+        ("Keywords", _join(trends_data.get("top_words") or {})),
+        ("Distinctive terms", _join(trends_data.get("distinctive_terms") or {})),
+        ("Rising terms", _join(item.get("term") for item in velocity.get("rising", []))),
+        ("Trending topics", _join(trends_data.get("top_trends") or [])),
+        ("Emerging patterns", _join(ai_analysis.get("emerging_patterns") or [])),
+        ("Content ideas", _join(ai_analysis.get("content_recommendations") or [])),
+        ("Summary", (ai_analysis.get("summary") or "")[:SUMMARY_CHARS] or None)
+    ]
+    return "\n".join(f"{label}: {value}" for label, value in lines if value)
+
+
+def get_trend_context(trends_data):
+    """Trend context of a trends document, built once per document _id"""
+    key = trends_data.get("_id") or content_key(trends_data)
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is not None:
+            _contexts.move_to_end(key)
+            return context
+
+    context = build_trend_context(trends_data)
+    with _contexts_lock:
+        _contexts[key] = context
+        while len(_contexts) > TREND_CONTEXT_CACHE_SIZE:
+            _contexts.popitem(last=False)
+    return context
+
+
+def build_video_prompt_request(form_data, trend_context):
+    """Single request producing both the detailed concept and the short prompt for the video model"""
+    return f"""
+Create a concise yet detailed video generation prompt that effectively showcases the product using the information provided below. The video should be cinematic, engaging, and visually rich, incorporating relevant current trends to enhance appeal. The final output should describe a short-form video concept—ideally under 5 seconds—that feels modern and compelling.
+
+PRODUCT INFORMATION:
+
+Product Name: {form_data.get('productName')}
+Description: {form_data.get('description')}
+Suggested Scenes or Key Moments: {form_data.get('scenes')}
+
+CURRENT TRENDS TO INCORPORATE:
+{trend_context}
+
+Make sure the prompt is visually descriptive, trend-aware, and tailored to a short video format suitable for platforms like TikTok, Instagram Reels, or YouTube Shorts.
+Dont give any audio or music descriptions, video will be silent.
+
+Answer in JSON:
+- "detailed_prompt": the video generation prompt described above
+- "video_prompt": the same ad reduced to 10 words, very concise and clear. It should be like: an object performing an action in a specific environment. It should be generalized, not product name like "a cat is walking".
+    """
+
+
+def batch_video_prompt_schema(count):
+    """Structured output of a batched video prompt call: exactly one prompt object per product, in order"""
+    return {"type": "array", "items": VIDEO_PROMPT_SCHEMA, "min_items": count, "max_items": count}
+
+
+def build_batch_video_prompt_request(forms, trend_context):
+    """Single request producing the video prompts of several products, sharing one copy of the trend context"""
+    products = "\n\n".join(
+        f"""Product {number}:
+Product Name: {form_data.get('productName')}
+Description: {form_data.get('description')}
+Suggested Scenes or Key Moments: {form_data.get('scenes')}"""
+        for number, form_data in enumerate(forms, 1)
+    )
+    return f"""
+Create a concise yet detailed video generation prompt for each of the {len(forms)} products below that effectively showcases the product. Each video should be cinematic, engaging, and visually rich, incorporating relevant current trends to enhance appeal. Each prompt should describe a short-form video concept—ideally under 5 seconds—that feels modern and compelling. Treat every product on its own, do not mix details between products.
+
+PRODUCTS:
+
+{products}
+
+CURRENT TRENDS TO INCORPORATE:
+{trend_context}
+
+Make sure the prompts are visually descriptive, trend-aware, and tailored to a short video format suitable for platforms like TikTok, Instagram Reels, or YouTube Shorts.
+Dont give any audio or music descriptions, videos will be silent.
+
+Answer in JSON with an array of exactly {len(forms)} objects, one per product in the order given:
+- "detailed_prompt": the video generation prompt described above
+- "video_prompt": the same ad reduced to 10 words, very concise and clear. It should be like: an object performing an action in a specific environment. It should be generalized, not product name like "a cat is walking".
+    """
@@ -0,0 +1,53 @@
+import time
+from flask import request, g
+from metrics import Gauge, Histogram
+from trends_cache import cache_requests
+from generation_cache import generation_cache_requests
+
+request_duration = Histogram("http_request_duration_seconds",
+                             "Time to produce a response (headers for streams) by route, method and status")
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being handled, by route")
+
+
+def _ratio(hits, misses):
+    total = hits + misses
+    return hits / total if total else 0
+
+
+def _cache_hit_ratios():
+    return [
+        ({"cache": "trends"}, _ratio(cache_requests.value(result="hit"), cache_requests.value(result="miss"))),
+        *(({"cache": cache}, _ratio(generation_cache_requests.value(cache=cache, result="hit"),
+                                    generation_cache_requests.value(cache=cache, result="miss")))
+          for cache in ("prompt", "video"))
+    ]
+
+
+cache_hit_ratio = Gauge("cache_hit_ratio", "Share of cache lookups served from the cache since start, by cache",
+                        callback=_cache_hit_ratios)
+
+
+def init_request_metrics(app):
+    """
+    Record latency and in-flight requests of every route. The hooks only read a clock
+    and update two in-memory metrics, so the cached /api/trends path stays cheap.
+    """
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        # Route template rather than the path, so ids do not create a series each
+        g.metrics_route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        requests_in_flight.inc(route=g.metrics_route)
+
+    @app.after_request
+    def record_duration(response):
+        if "request_started" in g:
+            request_duration.observe(time.perf_counter() - g.request_started, route=g.metrics_route,
+                                     method=request.method, status=str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def finish_request(exception=None):
+        if "metrics_route" in g:
+            requests_in_flight.dec(route=g.metrics_route)
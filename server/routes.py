@@ -1,10 +1,41 @@
-from flask import jsonify, request, send_file
+from flask import jsonify, request, Response, g
+import os
+import datetime
 import logging
-from db_service import get_latest_trends_data
-from video_service import generate_video_prompt, call_video_generation_api
+from db_service import get_trends_history, HISTORY_BUCKETS
+from trends_cache import get_cached_trends_data, get_cached_trends_response, FIELD_NAME_PATTERN, MAX_FIELDS
+from metrics import snapshot, render_prometheus
+from trend_events import trend_events
+from video_service import (generate_video_prompt, generate_video_prompts, call_video_generation_api,
+                           extract_video_params, video_download_name, pipeline_stages, VIDEO_STREAMING)
+from artifact_store import serve_artifact
+from admission import admission_controlled, video_admission, AdmissionRejected, rejection_response, client_id
+from video_jobs import video_jobs, serialize_job, QueueFullError, SUCCEEDED, FAILED
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of buckets per history page
+MAX_HISTORY_PAGE = 1000
+
+# Retry-After (seconds) suggested when the video job queue is full
+JOB_QUEUE_RETRY_AFTER = 30
+
+# Products accepted in one batch request, keep it within the job queue (VIDEO_JOB_WORKERS + VIDEO_JOB_QUEUE_SIZE)
+VIDEO_BATCH_MAX_ITEMS = int(os.getenv("VIDEO_BATCH_MAX_ITEMS", "20"))
+
+# Form fields every video request needs
+REQUIRED_VIDEO_FIELDS = ["productName", "description", "scenes"]
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 query parameter into a naive UTC datetime"""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    timestamp = datetime.datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return timestamp
+
 
 def register_routes(app):
     """Register all API routes for the application"""
@@ -12,25 +43,98 @@ def register_routes(app):
     @app.route('/api/trends', methods=['GET'])
     def get_latest_trends():
         """
-        Endpoint to retrieve the most recent trends data from MongoDB
+        Endpoint to retrieve the most recent trends data (served from the in-memory cache)
+        Optional query parameters: `domain` selects the latest analysis of that domain,
+        `fields` (comma-separated top-level fields) limits the returned fields
         """
         try:
-            latest_trend = get_latest_trends_data()
+            domain = request.args.get('domain', '').strip() or None
+            fields = None
+            if request.args.get('fields'):
+                fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+                if not all(FIELD_NAME_PATTERN.match(field) for field in fields) or len(fields) > MAX_FIELDS:
+                    return jsonify({"error": "fields must be a comma-separated list of top-level field names"}), 400
+
+            latest_trend, prepared = get_cached_trends_response(domain, fields)
 
             if latest_trend is None:
                 return jsonify({"error": "Database connection not available"}), 500
 
             if latest_trend == {}:
-                return jsonify({"error": "No trend data available"}), 404
+                return jsonify({"error": f"No trend data available{' for domain: ' + domain if domain else ''}"}), 404
 
-            logger.info(f"Retrieved latest trend data from {latest_trend.get('timestamp', 'unknown timestamp')}")
-            return jsonify(latest_trend)
+            # Pre-serialized body, compressed variant picked by Accept-Encoding, 304 on matching ETag
+            return prepared.to_response(request)
 
         except Exception as e:
             logger.error(f"Error retrieving trend data: {e}")
             return jsonify({"error": f"Failed to retrieve trend data: {str(e)}"}), 500
 
+    @app.route('/api/trends/stream', methods=['GET'])
+    def stream_trends():
+        """
+        Server-Sent Events stream that pushes a compact event ({domain, timestamp})
+        whenever a new analysis is stored. Optional query parameter `domain` filters events,
+        reconnecting clients (Last-Event-ID header) get the recent events they missed.
+        """
+        domain = request.args.get('domain', '').strip() or None
+        last_event_id = request.headers.get('Last-Event-ID')
+        last_version = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+        return Response(
+            trend_events.stream(domain, last_version),
+            mimetype='text/event-stream',
+            headers={
+                "Cache-Control": "no-cache",
+                # Ask nginx not to buffer the stream
+                "X-Accel-Buffering": "no"
+            }
+        )
+
+    @app.route('/api/trends/history', methods=['GET'])
+    def get_trends_history_route():
+        """
+        Endpoint returning per-hour or per-day summaries of past analyses.
+        Query parameters: domain, from, to (ISO 8601), bucket (hour|day), limit, cursor.
+        Follow `next_cursor` to read the next page.
+        """
+        try:
+            bucket = request.args.get('bucket', 'hour')
+            if bucket not in HISTORY_BUCKETS:
+                return jsonify({"error": f"bucket must be one of: {', '.join(HISTORY_BUCKETS)}"}), 400
+
+            try:
+                end = parse_timestamp(request.args['to']) if request.args.get('to') else datetime.datetime.utcnow()
+                start = parse_timestamp(request.args['from']) if request.args.get('from') else end - datetime.timedelta(days=7)
+                if request.args.get('cursor'):
+                    start = parse_timestamp(request.args['cursor'])
+                limit = min(int(request.args.get('limit', 48)), MAX_HISTORY_PAGE)
+            except ValueError as e:
+                return jsonify({"error": f"Invalid query parameter: {str(e)}"}), 400
+
+            if limit < 1 or start >= end:
+                return jsonify({"error": "Empty range: 'from' must be before 'to' and limit positive"}), 400
+
+            domain = request.args.get('domain', '').strip() or None
+            buckets, next_cursor = get_trends_history(start, end, bucket, domain, limit)
+            if buckets is None:
+                return jsonify({"error": "Database connection not available"}), 500
+
+            return jsonify({
+                "domain": domain,
+                "bucket": bucket,
+                "from": start.isoformat(),
+                "to": end.isoformat(),
+                "buckets": buckets,
+                "next_cursor": next_cursor
+            })
+
+        except Exception as e:
+            logger.error(f"Error retrieving trend history: {e}")
+            return jsonify({"error": f"Failed to retrieve trend history: {str(e)}"}), 500
+
     @app.route('/api/generate-video', methods=['POST'])
+    @admission_controlled(video_admission)
     def generate_video():
         """
         Endpoint to generate video based on product information and current trends
@@ -40,47 +144,60 @@ def register_routes(app):
             form_data = request.json
 
             # Validate required fields
-            if not form_data or not all(k in form_data for k in ["productName", "description", "scenes"]):
+            if not form_data or not all(k in form_data for k in REQUIRED_VIDEO_FIELDS):
                 return jsonify({"error": "Missing required fields"}), 400
 
             # Get latest trends data
-            trends_data = get_latest_trends_data()
+            with pipeline_stages.time(stage="trends_read"):
+                trends_data = get_cached_trends_data()
             if not trends_data:
                 return jsonify({"error": "Could not retrieve trends data"}), 500
 
             # Generate video prompt using Gemini
-            video_prompt = generate_video_prompt(form_data, trends_data)
+            with pipeline_stages.time(stage="prompt"):
+                video_prompt = generate_video_prompt(form_data, trends_data)
             if not video_prompt:
                 return jsonify({"error": "Failed to generate video prompt"}), 500
 
             # Extract video generation parameters from form_data if provided
-            video_params = {}
-            param_keys = ["negative_prompt", "num_inference_steps", "guidance_scale", 
-                          "height", "width", "num_frames", "fps"]
-            
-            for key in param_keys:
-                if key in form_data:
-                    video_params[key] = form_data[key]
+            video_params = extract_video_params(form_data)
+
+            # Relay the video while it downloads when streaming is enabled (?stream=true|false overrides)
+            relay = request.args.get('stream', str(VIDEO_STREAMING)).lower() == 'true'
 
             # Call external video generation API with user parameters
-            video_result = call_video_generation_api(video_prompt, **video_params)
+            video_result = call_video_generation_api(video_prompt, relay=relay, **video_params)
+            if video_result and 'video_path' in video_result:
+                # Send a stored video now, one evicted by another worker since the lookup is a miss
+                response = serve_artifact(video_result['video_path'],
+                                          download_name=video_download_name(video_result['prompt']))
+                if response is not None:
+                    logger.info(f"Video generated successfully for {form_data.get('productName')}")
+                    return response
+                video_result = call_video_generation_api(video_prompt, relay=relay, **video_params)
+
             if not video_result:
                 return jsonify({"error": "Failed to generate video"}), 500
 
             logger.info(f"Video generated successfully for {form_data.get('productName')}")
             
             # Handle different response types
-            if 'video_path' in video_result:
+            if 'stream' in video_result:
+                headers = {
+                    "Content-Disposition": f'attachment; filename="{video_download_name(video_result["prompt"])}"',
+                    # Ask nginx to pass chunks on instead of buffering the whole video
+                    "X-Accel-Buffering": "no"
+                }
+                if video_result['content_length']:
+                    headers["Content-Length"] = video_result['content_length']
+                # The upstream download is still running, keep the admission slot until it ends
+                g.hold_admission_slot = True
+                return Response(video_result['stream'], mimetype='video/mp4', headers=headers, direct_passthrough=True)
+            elif 'video_path' in video_result:
                 # If we received a video file, send it to the client
-                video_path = video_result['video_path']
-                prompt_for_filename = video_result['prompt'].split('\n')[0] if video_result['prompt'] else "generated_video"
-                
-                return send_file(
-                    video_path, 
-                    mimetype='video/mp4', 
-                    as_attachment=True,
-                    download_name=f"{prompt_for_filename.replace(' ', '_')[:30]}.mp4"
-                )
+                response = serve_artifact(video_result['video_path'],
+                                          download_name=video_download_name(video_result['prompt']))
+                return response or (jsonify({"error": "Failed to generate video"}), 500)
             else:
                 # If we received JSON, return it to the client
                 return jsonify({
@@ -92,3 +209,184 @@ def register_routes(app):
         except Exception as e:
             logger.error(f"Error in video generation process: {e}")
             return jsonify({"error": f"Video generation failed: {str(e)}"}), 500
+
+    @app.route('/api/video-jobs', methods=['POST'])
+    def create_video_job():
+        """
+        Endpoint to queue a video generation job, returns its id immediately.
+        Poll /api/video-jobs/<job_id> for progress and fetch /api/video-jobs/<job_id>/result once succeeded.
+        """
+        try:
+            form_data = request.json
+
+            # Validate required fields
+            if not form_data or not all(k in form_data for k in REQUIRED_VIDEO_FIELDS):
+                return jsonify({"error": "Missing required fields"}), 400
+
+            # Jobs run on their own bounded pool, only the per-client rate limit applies here
+            wait = video_admission.buckets.take(client_id())
+            if wait:
+                return rejection_response(AdmissionRejected("rate_limited", wait))
+
+            try:
+                job = video_jobs.submit(form_data, extract_video_params(form_data))
+            except QueueFullError as e:
+                logger.warning(f"Rejected video job: {e}")
+                video_admission.buckets.refund(client_id())
+                return rejection_response(AdmissionRejected("queue_full", JOB_QUEUE_RETRY_AFTER))
+
+            if job is None:
+                return jsonify({"error": "Database connection not available"}), 500
+
+            logger.info(f"Queued video job {job['_id']} for {form_data.get('productName')}")
+            response = serialize_job(job)
+            response["statusUrl"] = f"/api/video-jobs/{job['_id']}"
+            return jsonify(response), 202, {"Location": response["statusUrl"]}
+
+        except Exception as e:
+            logger.error(f"Error queueing video job: {e}")
+            return jsonify({"error": f"Failed to queue video job: {str(e)}"}), 500
+
+    @app.route('/api/generate-video/batch', methods=['POST'])
+    def generate_video_batch():
+        """
+        Endpoint to queue video jobs for several products at once: {"items": [form, ...]}.
+        Reads the trends once, writes all the prompts in one Gemini call and queues one job per
+        product, returns their ids in the order of the items.
+        """
+        charged = False
+        reserved = False
+        try:
+            body = request.json
+            items = body.get("items") if isinstance(body, dict) else None
+            if not isinstance(items, list) or not items:
+                return jsonify({"error": "Expected a non-empty 'items' list"}), 400
+            if len(items) > VIDEO_BATCH_MAX_ITEMS:
+                return jsonify({"error": f"At most {VIDEO_BATCH_MAX_ITEMS} items per batch"}), 400
+
+            invalid = [index for index, form_data in enumerate(items)
+                       if not isinstance(form_data, dict) or not all(k in form_data for k in REQUIRED_VIDEO_FIELDS)]
+            if invalid:
+                return jsonify({"error": "Missing required fields", "invalidItems": invalid}), 400
+
+            # A batch counts as one request against the client's rate limit, the job queue bounds the renders
+            wait = video_admission.buckets.take(client_id())
+            if wait:
+                return rejection_response(AdmissionRejected("rate_limited", wait))
+            charged = True
+
+            # Hold room for the jobs before paying for the prompts, a full queue is rejected right away
+            try:
+                video_jobs.reserve(len(items))
+            except QueueFullError as e:
+                logger.warning(f"Rejected video batch: {e}")
+                video_admission.buckets.refund(client_id())
+                return rejection_response(AdmissionRejected("queue_full", JOB_QUEUE_RETRY_AFTER))
+            reserved = True
+
+            with pipeline_stages.time(stage="trends_read"):
+                trends_data = get_cached_trends_data()
+            if not trends_data:
+                video_jobs.release(len(items))
+                video_admission.buckets.refund(client_id())
+                return jsonify({"error": "Could not retrieve trends data"}), 500
+
+            # Products whose prompt could not be generated here get it written by their job
+            with pipeline_stages.time(stage="batch_prompt"):
+                prompts = generate_video_prompts(items, trends_data)
+
+            # submit_many consumes the reservation, releasing it if the jobs cannot be queued
+            reserved = False
+            jobs = video_jobs.submit_many([
+                (form_data, extract_video_params(form_data), prompt) for form_data, prompt in zip(items, prompts)
+            ], reserved=True)
+
+            if jobs is None:
+                video_admission.buckets.refund(client_id())
+                return jsonify({"error": "Database connection not available"}), 500
+
+            logger.info(f"Queued a batch of {len(jobs)} video jobs")
+            views = []
+            for index, job in enumerate(jobs):
+                view = serialize_job(job)
+                view["index"] = index
+                view["statusUrl"] = f"/api/video-jobs/{job['_id']}"
+                views.append(view)
+            return jsonify({"jobs": views}), 202
+
+        except Exception as e:
+            logger.error(f"Error queueing video batch: {e}")
+            # Nothing was queued, the batch does not count against the rate limit
+            if reserved:
+                video_jobs.release(len(items))
+            if charged:
+                video_admission.buckets.refund(client_id())
+            return jsonify({"error": f"Failed to queue video batch: {str(e)}"}), 500
+
+    @app.route('/api/video-jobs/<job_id>', methods=['GET'])
+    def get_video_job(job_id):
+        """
+        Endpoint reporting the state (queued/running/succeeded/failed), stage and progress of a video job
+        """
+        try:
+            job = video_jobs.get(job_id)
+            if job is None:
+                return jsonify({"error": "Database connection not available"}), 500
+            if not job:
+                return jsonify({"error": f"Unknown video job: {job_id}"}), 404
+
+            response = serialize_job(job)
+            if job["state"] == SUCCEEDED:
+                response["resultUrl"] = f"/api/video-jobs/{job_id}/result"
+            return jsonify(response)
+
+        except Exception as e:
+            logger.error(f"Error retrieving video job {job_id}: {e}")
+            return jsonify({"error": f"Failed to retrieve video job: {str(e)}"}), 500
+
+    @app.route('/api/video-jobs/<job_id>/result', methods=['GET'])
+    def get_video_job_result(job_id):
+        """
+        Endpoint returning the generated video of a succeeded job (or its URL when the video API returned JSON)
+        """
+        try:
+            job = video_jobs.get(job_id)
+            if job is None:
+                return jsonify({"error": "Database connection not available"}), 500
+            if not job:
+                return jsonify({"error": f"Unknown video job: {job_id}"}), 404
+            if job["state"] == FAILED:
+                return jsonify({"error": job.get("error") or "Video generation failed"}), 409
+            if job["state"] != SUCCEEDED:
+                return jsonify({"error": f"Video job is {job['state']}", "state": job["state"]}), 409
+
+            result = job["result"]
+            if 'video_path' in result:
+                response = serve_artifact(result['video_path'], download_name=video_download_name(result['prompt']))
+                if response is None:
+                    return jsonify({"error": "Video file is no longer available"}), 410
+                return response
+
+            return jsonify({
+                "success": True,
+                "videoUrl": result.get("videoUrl"),
+                "prompt": result.get("prompt")
+            })
+
+        except Exception as e:
+            logger.error(f"Error retrieving video job result {job_id}: {e}")
+            return jsonify({"error": f"Failed to retrieve video job result: {str(e)}"}), 500
+
+    @app.route('/api/metrics', methods=['GET'])
+    def get_metrics():
+        """
+        Endpoint exposing server metrics (cache hits, staleness, ...) as JSON
+        """
+        return jsonify(snapshot())
+
+    @app.route('/metrics', methods=['GET'])
+    def get_prometheus_metrics():
+        """
+        Endpoint exposing the same metrics in the Prometheus text format (per server process)
+        """
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,86 @@
+import os
+import json
+import threading
+from collections import deque
+from metrics import Gauge
+
+# Seconds between keep-alive comments on idle streams (keeps proxies from closing them)
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "25"))
+
+# Number of recent events kept for clients that fall behind or reconnect with Last-Event-ID
+TREND_EVENT_HISTORY = int(os.getenv("TREND_EVENT_HISTORY", "256"))
+
+
+class TrendEventBroker:
+    """
+    Fan-out of "new analysis" events from the single trends watcher to every SSE client.
+
+    The last TREND_EVENT_HISTORY events are kept in a ring with their version number;
+    clients wait on a shared condition and replay every event newer than the last one
+    they sent, so an idle connection costs one waiting thread (or greenlet, under gevent
+    workers) and no per-client queue, and bursts of events are not collapsed.
+    """
+
+    def __init__(self, history=TREND_EVENT_HISTORY):
+        self._condition = threading.Condition()
+        self._version = 0
+        self._events = deque(maxlen=history)
+        self.clients = 0
+
+    def publish(self, event):
+        with self._condition:
+            self._version += 1
+            self._events.append((self._version, event))
+            self._condition.notify_all()
+
+    def _since(self, last_version):
+        # A version ahead of ours comes from before a restart, replay everything kept
+        if last_version > self._version:
+            last_version = 0
+        return self._version, [(version, event) for version, event in self._events if version > last_version]
+
+    def current(self):
+        with self._condition:
+            return self._version
+
+    def wait(self, last_version, timeout):
+        """
+        Block until an event newer than last_version is published, or the timeout expires.
+        Returns (version, [(version, event), ...] newer than last_version still in the ring).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != last_version, timeout)
+            return self._since(last_version)
+
+    def stream(self, domain=None, last_version=None):
+        """
+        Generator of SSE frames for one client, optionally only events of one domain.
+        Reconnecting clients (Last-Event-ID) get the events they missed that are still kept.
+        """
+        with self._condition:
+            self.clients += 1
+        try:
+            version = self.current() if last_version is None else last_version
+            yield "retry: 5000\n\n"
+            while True:
+                new_version, events = self.wait(version, SSE_HEARTBEAT_INTERVAL)
+                if new_version == version:
+                    yield ": keep-alive\n\n"
+                    continue
+                version = new_version
+                for event_version, event in events:
+                    if domain is None or event.get("domain") == domain:
+                        yield _format_event(event_version, event)
+        finally:
+            with self._condition:
+                self.clients -= 1
+
+
+def _format_event(version, event):
+    return f"id: {version}\nevent: trends\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+trend_events = TrendEventBroker()
+
+stream_clients = Gauge("trends_stream_clients", "Open /api/trends/stream connections",
+                       callback=lambda: trend_events.clients)
@@ -0,0 +1,275 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from db_service import get_latest_trends_data, get_trend_markers_since, watch_trend_inserts, serialize_timestamp
+from metrics import Counter, Gauge
+from prepared_response import PreparedResponse
+from trend_events import trend_events
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Fallback polling interval (seconds) when change streams are unavailable
+TRENDS_POLL_INTERVAL = float(os.getenv("TRENDS_POLL_INTERVAL", "15"))
+
+# Number of latest documents (per domain and field selection) kept in memory, least recently used are evicted
+TRENDS_CACHE_DOMAINS = int(os.getenv("TRENDS_CACHE_DOMAINS", "32"))
+
+# Field sets whose responses are serialized as soon as a document is cached ("a,b;c,d")
+TRENDS_FIELD_PRESETS = os.getenv(
+    "TRENDS_FIELD_PRESETS",
+    "timestamp,domain,top_hashtags,top_words,top_trends,sentiment;timestamp,domain,top_hashtags,sentiment"
+)
+
+# Other field sets are serialized on first use, up to this many per cached document
+MAX_FIELD_VARIANTS = 16
+
+# Fields never served by the trends API
+EXCLUDED_FIELDS = {"platform_data"}
+
+# Field selection on /api/trends: top-level field names only
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+MAX_FIELDS = 20
+
+cache_requests = Counter("trends_cache_requests_total", "Latest-trends cache lookups by result (hit/miss)")
+
+
+def normalize_fields(fields):
+    """Canonical, hashable form of a field selection (None selects the whole document)"""
+    if not fields:
+        return None
+    selected = tuple(sorted({field for field in fields if field and field not in EXCLUDED_FIELDS}))
+    return selected or None
+
+
+def project_document(document, fields):
+    """Apply a top-level field projection to a cached document, keeping _id like MongoDB does"""
+    if not document or fields is None:
+        return document
+    return {key: value for key, value in document.items() if key == "_id" or key in fields}
+
+
+PRESET_FIELDS = [normalize_fields(preset.split(",")) for preset in TRENDS_FIELD_PRESETS.split(";") if preset.strip()]
+
+
+class TrendsEntry:
+    """Cached latest document of one domain with its pre-serialized response variants"""
+
+    def __init__(self, document, fields=None, generation=0):
+        self.document = document
+        self.fields = fields
+        # Order of the read that loaded the document, a later read holds newer data
+        self.generation = generation
+        self.response = PreparedResponse(document) if document else None
+        self.loaded_at = time.time()
+        self._variants = {}
+
+        # Full documents also prepare the common field selections up front
+        if document and fields is None:
+            for preset in PRESET_FIELDS:
+                self._variants[preset] = PreparedResponse(project_document(document, preset))
+
+    def variant(self, fields):
+        """(document, response) for a field selection, projected from this full document"""
+        if fields is None or fields == self.fields or not self.document:
+            return self.document, self.response
+
+        response = self._variants.get(fields)
+        if response is None:
+            response = PreparedResponse(project_document(self.document, fields))
+            if len(self._variants) < len(PRESET_FIELDS) + MAX_FIELD_VARIANTS:
+                self._variants[fields] = response
+        return self.document, response
+
+
+class TrendsCache:
+    """
+    Holds the latest trends document, overall and per domain, in memory.
+
+    Entries are kept in an LRU keyed by (domain, fields): domain None is the latest
+    document of any domain, fields None the whole document. Field selections are
+    projected from a cached whole document when there is one, and only pushed down
+    to a MongoDB projection on a miss.
+
+    A background watcher keeps the entries current through a change stream on the
+    trends collection, falling back to polling for new timestamps when change streams
+    are not supported. When a new analysis lands only the entries it affects (its
+    domain and the overall latest) are refreshed. Readers never touch the database
+    while an entry is cached.
+    """
+
+    def __init__(self, max_entries=TRENDS_CACHE_DOMAINS):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._verified_at = None
+        self._high_water = None
+        self._mode = "idle"
+        self._stop = threading.Event()
+        self._thread = None
+        self._flights = SingleFlight("trends_cache")
+        self._generation = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def get_entry(self, domain=None, fields=None):
+        """
+        Return a cached entry able to serve (domain, fields), loading it on a miss
+        (None if the database is unavailable)
+        """
+        entry = self._lookup((domain, fields))
+        if entry is None and fields is not None:
+            entry = self._lookup((domain, None))
+        if entry is not None:
+            cache_requests.inc(result="hit")
+            return entry
+
+        cache_requests.inc(result="miss")
+        # Concurrent misses of the same key share one database read and serialization
+        return self._flights.do((domain, fields), lambda: self._lookup((domain, fields)) or self.refresh(domain, fields))
+
+    def get(self, domain=None):
+        """Return the cached document for a domain, same contract as get_latest_trends_data"""
+        entry = self.get_entry(domain)
+        return entry.document if entry is not None else None
+
+    def get_response(self, domain=None, fields=None):
+        """Return (document, PreparedResponse) for a domain and field selection, the response is None without data"""
+        entry = self.get_entry(domain, fields)
+        if entry is None:
+            return None, None
+        return entry.variant(fields)
+
+    def refresh(self, domain=None, fields=None):
+        """
+        Reload the latest document of a domain (optionally only some fields) from the database.
+        Only domains with an analysis are cached, so unknown domains cannot evict real entries.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        document = get_latest_trends_data(domain, fields)
+        if document is None:
+            return None
+
+        key = (domain, fields)
+        entry = TrendsEntry(document, fields, generation)
+        if not document:
+            return entry
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.generation > generation:
+                # A read started after this one already stored newer data
+                return current
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._verified_at is None:
+                self._verified_at = entry.loaded_at
+        return entry
+
+    def on_new_analysis(self, domain, timestamp=None):
+        """Refresh the cached entries a new analysis of `domain` affects, then notify stream clients"""
+        with self._lock:
+            affected = [key for key in self._entries if key[0] is None or key[0] == domain]
+        logger.info(f"New trend analysis for {domain or 'all domains'}, refreshing {len(affected)} cache entries")
+        for key in affected:
+            self.refresh(*key)
+
+        trend_events.publish({"domain": domain, "timestamp": serialize_timestamp(timestamp)})
+
+    def start(self):
+        """Start the background watcher thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="trends-cache-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_all(self):
+        with self._lock:
+            keys = list(self._entries)
+        for key in keys:
+            self.refresh(*key)
+
+    def _watch(self):
+        try:
+            with watch_trend_inserts() as stream:
+                self._mode = "change_stream"
+                logger.info("Watching trends collection through a change stream")
+                # Anything inserted before the stream opened is picked up here
+                self._refresh_all()
+                while not self._stop.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        document = change.get("fullDocument", {})
+                        self.on_new_analysis(document.get("domain"), document.get("timestamp"))
+                    self._verified_at = time.time()
+        except Exception as e:
+            logger.warning(f"Change stream unavailable, polling every {TRENDS_POLL_INTERVAL}s instead: {e}")
+
+        self._mode = "polling"
+        self._poll()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            markers = get_trend_markers_since(self._high_water)
+            if markers is not None:
+                if markers and self._high_water is None:
+                    # First check: anything may have changed since the entries were loaded
+                    self._high_water = markers[0]["timestamp"]
+                    self._refresh_all()
+                elif markers:
+                    self._high_water = markers[0]["timestamp"]
+                    # Markers are newest first, keep the newest timestamp of every domain
+                    newest = {}
+                    for marker in markers:
+                        newest.setdefault(marker.get("domain"), marker["timestamp"])
+                    for domain, timestamp in newest.items():
+                        self.on_new_analysis(domain, timestamp)
+                self._verified_at = time.time()
+            self._stop.wait(TRENDS_POLL_INTERVAL)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "mode": self._mode,
+            "entries": entries,
+            # Time since the cache was last confirmed to match the database
+            "staleness_seconds": round(now - self._verified_at, 3) if self._verified_at else None
+        }
+
+
+latest_trends = TrendsCache()
+
+cache_staleness = Gauge("trends_cache_staleness_seconds",
+                        "Seconds since the cached latest trends were last confirmed current",
+                        callback=lambda: latest_trends.stats()["staleness_seconds"] or 0)
+
+
+def get_cached_trends_data(domain=None):
+    """Latest trends document (optionally of one domain) served from memory"""
+    return latest_trends.get(domain)
+
+
+def get_cached_trends_response(domain=None, fields=None):
+    """Latest trends document (optionally of one domain) with the pre-serialized response for `fields`"""
+    return latest_trends.get_response(domain, normalize_fields(fields))
+
+
+def start_trends_watcher():
+    latest_trends.start()
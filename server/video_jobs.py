@@ -0,0 +1,331 @@
+import os
+import uuid
+import socket
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument
+from db_service import get_video_jobs_collection
+from trends_cache import get_cached_trends_data
+from video_service import generate_video_prompt, call_video_generation_api, pipeline_stages
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Number of video jobs executed concurrently by this process
+VIDEO_JOB_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))
+
+# Jobs waiting for a worker beyond this many are rejected instead of queued
+VIDEO_JOB_QUEUE_SIZE = int(os.getenv("VIDEO_JOB_QUEUE_SIZE", "20"))
+
+# Seconds between heartbeats of the jobs a process owns, and between checks for abandoned jobs
+VIDEO_JOB_HEARTBEAT_INTERVAL = float(os.getenv("VIDEO_JOB_HEARTBEAT_INTERVAL", "30"))
+
+# Jobs without a heartbeat for this many seconds are abandoned (their process died) and taken over
+VIDEO_JOB_STALE_SECONDS = float(os.getenv("VIDEO_JOB_STALE_SECONDS", "120"))
+
+# A job abandoned this many times is failed instead of being retried again
+MAX_JOB_ATTEMPTS = 3
+
+# Job states and the stages a running job goes through, with their progress percentage
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+STAGES = {
+    "queued": 0,
+    "fetching_trends": 10,
+    "generating_prompt": 30,
+    "rendering_video": 60,
+    "done": 100
+}
+
+video_jobs_total = Counter("video_jobs_total", "Video jobs by outcome (submitted/rejected/succeeded/failed/recovered)")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the wait queue is full"""
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+def _process_id():
+    """Owner id of the jobs run by this process, unique across hosts and restarts"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def serialize_job(job):
+    """Public view of a job document for the API"""
+    if not job:
+        return job
+    view = {
+        "jobId": job["_id"],
+        "state": job["state"],
+        "stage": job.get("stage"),
+        "progress": job.get("progress", 0),
+        "createdAt": job["created_at"].isoformat(),
+        "updatedAt": job["updated_at"].isoformat(),
+        "error": job.get("error")
+    }
+    result = job.get("result")
+    if result:
+        view["prompt"] = result.get("prompt")
+        view["videoUrl"] = result.get("videoUrl")
+    return view
+
+
+class VideoJobManager:
+    """
+    Runs video generation jobs on a bounded thread pool.
+
+    Jobs are persisted in the video_jobs collection before being queued, owned by the
+    process that queued them, and a worker claims a job by atomically moving it from
+    queued to running, so a job is executed once even when several server processes
+    share the database. A heartbeat thread refreshes the jobs this process owns and
+    takes over queued or running jobs whose owner stopped sending heartbeats (a crash
+    or a deploy), so they are queued again within VIDEO_JOB_STALE_SECONDS.
+    """
+
+    def __init__(self, workers=VIDEO_JOB_WORKERS, queue_size=VIDEO_JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="video-job")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.owner = _process_id()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, form_data, video_params, video_prompt=None):
+        """Persist and queue a new job, returns the job document (None if the database is unavailable)"""
+        jobs = self.submit_many([(form_data, video_params, video_prompt)])
+        return jobs[0] if jobs else None
+
+    def reserve(self, count):
+        """
+        Hold room in the queue for count jobs, raises QueueFullError if there is none. The
+        reservation is consumed by submit_many(..., reserved=True) or given back with release.
+        """
+        with self._lock:
+            if self.pending + count > self.workers + self.queue_size:
+                video_jobs_total.inc(count, outcome="rejected")
+                raise QueueFullError(f"{self.pending} video jobs already waiting or running, "
+                                     f"no room for {count} more")
+            self.pending += count
+
+    def release(self, count):
+        """Give back room reserved for jobs that were not submitted"""
+        with self._lock:
+            self.pending -= count
+
+    def submit_many(self, items, reserved=False):
+        """
+        Persist and queue several jobs at once, all or none, from (form_data, video_params, video_prompt)
+        tuples. A job given its video_prompt skips the trends and prompt stages. Returns the job
+        documents in order (None if the database is unavailable). With reserved, the room for the
+        jobs was taken with reserve beforehand and is released here if they cannot be queued.
+        """
+        collection = get_video_jobs_collection()
+        if collection is None:
+            if reserved:
+                self.release(len(items))
+            return None
+
+        if not reserved:
+            self.reserve(len(items))
+
+        now = _now()
+        jobs = []
+        for form_data, video_params, video_prompt in items:
+            job = {
+                "_id": uuid.uuid4().hex,
+                "state": QUEUED,
+                "stage": "queued",
+                "progress": STAGES["queued"],
+                "form_data": form_data,
+                "video_params": video_params,
+                "attempts": 0,
+                "owner": self.owner,
+                "heartbeat_at": now,
+                "created_at": now,
+                "updated_at": now
+            }
+            if video_prompt:
+                job["video_prompt"] = video_prompt
+            jobs.append(job)
+        try:
+            collection.insert_many(jobs)
+        except Exception:
+            self.release(len(items))
+            raise
+
+        video_jobs_total.inc(len(jobs), outcome="submitted")
+        for job in jobs:
+            self._executor.submit(self._run, job["_id"])
+        return jobs
+
+    def get(self, job_id):
+        """Job document by id, {} if unknown, None if the database is unavailable"""
+        collection = get_video_jobs_collection()
+        if collection is None:
+            return None
+        return collection.find_one({"_id": job_id}) or {}
+
+    def start(self):
+        """Start the heartbeat thread (idempotent), with an owner id of this process"""
+        if self._thread and self._thread.is_alive():
+            return
+        # Forked workers must not share the owner id of the process they were forked from
+        self.owner = _process_id()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name="video-job-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat(self):
+        while not self._stop.is_set():
+            self.beat()
+            self.recover()
+            self._stop.wait(VIDEO_JOB_HEARTBEAT_INTERVAL)
+
+    def beat(self):
+        """Mark the jobs this process owns as alive"""
+        collection = get_video_jobs_collection()
+        if collection is None:
+            return
+        try:
+            collection.update_many({"owner": self.owner, "state": {"$in": [QUEUED, RUNNING]}},
+                                   {"$set": {"heartbeat_at": _now()}})
+        except Exception as e:
+            logger.error(f"Failed to refresh the video job heartbeat: {e}")
+
+    def recover(self):
+        """Take over the jobs left behind by processes that stopped sending heartbeats, returns how many"""
+        collection = get_video_jobs_collection()
+        if collection is None:
+            return 0
+
+        try:
+            stale_before = _now() - datetime.timedelta(seconds=VIDEO_JOB_STALE_SECONDS)
+            abandoned = {
+                "state": {"$in": [QUEUED, RUNNING]},
+                "owner": {"$ne": self.owner},
+                "$or": [
+                    {"heartbeat_at": {"$lt": stale_before}},
+                    # Jobs queued before heartbeats existed
+                    {"heartbeat_at": {"$exists": False}, "updated_at": {"$lt": stale_before}}
+                ]
+            }
+            # Jobs interrupted too often are failed instead of being retried again
+            collection.update_many(
+                {**abandoned, "state": RUNNING, "attempts": {"$gte": MAX_JOB_ATTEMPTS}},
+                {"$set": {"state": FAILED, "error": "Job was interrupted too many times",
+                          "updated_at": _now(), "finished_at": _now()}}
+            )
+
+            # One job at a time, so processes recovering together split the jobs between them
+            recovered = 0
+            while self.pending < self.workers + self.queue_size:
+                job = collection.find_one_and_update(
+                    abandoned,
+                    {"$set": {"state": QUEUED, "stage": "queued", "progress": STAGES["queued"],
+                              "owner": self.owner, "heartbeat_at": _now(), "updated_at": _now()}},
+                    projection={"_id": 1}, sort=[("created_at", 1)]
+                )
+                if job is None:
+                    break
+                with self._lock:
+                    self.pending += 1
+                self._executor.submit(self._run, job["_id"])
+                recovered += 1
+
+            if recovered:
+                video_jobs_total.inc(recovered, outcome="recovered")
+                logger.info(f"Recovered {recovered} abandoned video jobs")
+            return recovered
+        except Exception as e:
+            logger.error(f"Failed to recover video jobs: {e}")
+            return 0
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = _now()
+        # A job taken over by another process is no longer updated from here
+        get_video_jobs_collection().update_one({"_id": job_id, "owner": self.owner}, {"$set": fields})
+
+    def _set_stage(self, job_id, stage):
+        self._update(job_id, stage=stage, progress=STAGES[stage])
+
+    def _run(self, job_id):
+        try:
+            collection = get_video_jobs_collection()
+            job = collection.find_one_and_update(
+                {"_id": job_id, "state": QUEUED, "owner": self.owner},
+                {"$set": {"state": RUNNING, "started_at": _now(), "heartbeat_at": _now(), "updated_at": _now()},
+                 "$inc": {"attempts": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                # Taken over by another process, or no longer queued
+                return
+
+            result, error = self._execute(job)
+            if result:
+                self._update(job_id, state=SUCCEEDED, stage="done", progress=STAGES["done"],
+                             result=result, finished_at=_now())
+                video_jobs_total.inc(outcome="succeeded")
+                logger.info(f"Video job {job_id} succeeded")
+            else:
+                self._update(job_id, state=FAILED, error=error, finished_at=_now())
+                video_jobs_total.inc(outcome="failed")
+                logger.error(f"Video job {job_id} failed: {error}")
+        except Exception as e:
+            logger.error(f"Error running video job {job_id}: {e}")
+            try:
+                self._update(job_id, state=FAILED, error=f"Video generation failed: {str(e)}", finished_at=_now())
+            except Exception:
+                pass
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _execute(self, job):
+        """Run the generation chain for one job, returns (result, error)"""
+        job_id = job["_id"]
+        form_data = job["form_data"]
+
+        # Batch submissions come with the prompt generated up front
+        video_prompt = job.get("video_prompt")
+        if not video_prompt:
+            self._set_stage(job_id, "fetching_trends")
+            with pipeline_stages.time(stage="trends_read"):
+                trends_data = get_cached_trends_data()
+            if not trends_data:
+                return None, "Could not retrieve trends data"
+
+            self._set_stage(job_id, "generating_prompt")
+            with pipeline_stages.time(stage="prompt"):
+                video_prompt = generate_video_prompt(form_data, trends_data)
+            if not video_prompt:
+                return None, "Failed to generate video prompt"
+
+        self._set_stage(job_id, "rendering_video")
+        video_result = call_video_generation_api(video_prompt, **job.get("video_params", {}))
+        if not video_result:
+            return None, "Failed to generate video"
+
+        if "video_path" in video_result:
+            return {"video_path": video_result["video_path"], "prompt": video_prompt}, None
+        return {"videoUrl": video_result.get("json_response", {}).get("videoUrl"), "prompt": video_prompt}, None
+
+
+video_jobs = VideoJobManager()
+
+pending_jobs = Gauge("video_jobs_pending", "Video jobs waiting for or holding a worker in this process",
+                    callback=lambda: video_jobs.pending)
+
+
+def start_video_jobs():
+    """Start the job heartbeat, which also resumes jobs a previous server process left queued or running"""
+    video_jobs.start()
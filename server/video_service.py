@@ -1,10 +1,17 @@
 import os
+import re
 import json
+import time
 import logging
+from contextlib import nullcontext
 import google.generativeai as genai
 from regex import F
-import requests
 from dotenv import load_dotenv
+from generation_cache import prompt_cache, prompt_cache_key, video_cache
+from http_client import upstream_request
+from prompt_builder import (get_trend_context, build_video_prompt_request, build_batch_video_prompt_request,
+                            batch_video_prompt_schema, VIDEO_PROMPT_SCHEMA)
+from metrics import Counter, Histogram
 
 # Ensure environment variables are loaded
 load_dotenv()
@@ -13,66 +20,172 @@ logger = logging.getLogger(__name__)
 
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+
+# Alternative Gemini endpoint reached over REST (the load test's local stand-in), unset for Google's
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# Gemini transport, "grpc" or "rest". gRPC ignores gevent's monkey-patching and would block
+# a whole gevent worker during each call, so gunicorn.conf.py selects rest for gevent workers
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "rest" if GEMINI_API_ENDPOINT else "grpc")
+
+genai.configure(api_key=GEMINI_API_KEY, transport=GEMINI_TRANSPORT,
+                client_options={"api_endpoint": GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None)
+
+# Gemini model writing the video prompts
+GEMINI_VIDEO_MODEL = os.getenv("GEMINI_VIDEO_MODEL", "gemini-1.5-flash")
+
+# JSON answers following the video prompt schema
+VIDEO_PROMPT_CONFIG = {"response_mime_type": "application/json", "response_schema": VIDEO_PROMPT_SCHEMA}
+
+pipeline_stages = Histogram("video_pipeline_stage_seconds",
+                            "Duration of the video generation stages (trends_read, prompt, video_request, video_download)")
+gemini_errors = Counter("gemini_request_errors_total", "Failed Gemini calls by call and error type")
+gemini_latency = Histogram("gemini_request_duration_seconds", "Gemini call latency by call")
+gemini_tokens = Counter("gemini_tokens_total", "Gemini tokens by call and kind (prompt/output)")
 
 # External video API configuration
 VIDEO_API_URL = os.getenv("VIDEO_API_URL", "http://localhost:5000/generate-video")
 
 
+# Relay upstream videos to the client while they download instead of after (overridable per request)
+VIDEO_STREAMING = os.getenv("VIDEO_STREAMING", "false").lower() == "true"
+
+# Keep a copy of relayed videos in the artifact store
+VIDEO_STREAM_TEE = os.getenv("VIDEO_STREAM_TEE", "true").lower() == "true"
+
+# Size of the chunks read from the video API
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# Optional video generation parameters accepted from the product form
+VIDEO_PARAM_KEYS = ["negative_prompt", "num_inference_steps", "guidance_scale",
+                    "height", "width", "num_frames", "fps"]
+
+
+def record_gemini_usage(response, latency, call):
+    """Report the latency and token counts of a Gemini call"""
+    gemini_latency.observe(latency, call=call)
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    gemini_tokens.inc(prompt_tokens, call=call, kind="prompt")
+    gemini_tokens.inc(output_tokens, call=call, kind="output")
+    logger.info(f"Gemini {call} call took {latency:.2f}s ({prompt_tokens} prompt / {output_tokens} output tokens)")
+
+
+def extract_video_params(form_data):
+    """Pick the video generation parameters present in the form data"""
+    return {key: form_data[key] for key in VIDEO_PARAM_KEYS if key in form_data}
+
+
 def generate_video_prompt(form_data, trends_data):
     """
     Generate a video prompt using Gemini model with form data and trends
     """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        # Same product form and trends snapshot give the same prompt
+        cache_key = prompt_cache_key(form_data, trends_data)
+        cached_prompt = prompt_cache.get(cache_key)
+        if cached_prompt is not None:
+            logger.info("Video prompt served from cache")
+            return cached_prompt
 
-        prompt = f"""
-Create a concise yet detailed video generation prompt that effectively showcases the product using the information provided below. The video should be cinematic, engaging, and visually rich, incorporating relevant current trends to enhance appeal. The final output should describe a short-form video concept—ideally under 5 seconds—that feels modern and compelling.
+        model = genai.GenerativeModel(GEMINI_VIDEO_MODEL)
+        prompt = build_video_prompt_request(form_data, get_trend_context(trends_data))
 
-PRODUCT INFORMATION:
+        # One structured call returns both the detailed concept and the 10-word prompt
+        start = time.perf_counter()
+        response = model.generate_content(prompt, generation_config=VIDEO_PROMPT_CONFIG)
+        record_gemini_usage(response, time.perf_counter() - start, "video_prompt")
 
-Product Name: {form_data.get('productName')}
-Description: {form_data.get('description')}
-Suggested Scenes or Key Moments: {form_data.get('scenes')}
+        result = json.loads(response.text)
+        video_prompt = result["video_prompt"].strip()
 
-CURRENT TRENDS TO INCORPORATE:
-{json.dumps(trends_data, indent=2)}
+        logger.info("Video prompt generated successfully")
+        logger.debug(f"Video prompt: {result.get('detailed_prompt')}")
+        logger.debug(f"Simplified video prompt: {video_prompt}")
 
-Make sure the prompt is visually descriptive, trend-aware, and tailored to a short video format suitable for platforms like TikTok, Instagram Reels, or YouTube Shorts.
-Dont give any audio or music descriptions, video will be silent.
-        """
+        prompt_cache.put(cache_key, video_prompt)
 
-        response = model.generate_content(prompt)
-        video_prompt = response.text
+        return video_prompt
+
+    except Exception as e:
+        gemini_errors.inc(call="video_prompt", error=type(e).__name__)
+        logger.error(f"Error generating video prompt: {e}")
+        return None
 
-        logger.info("Video prompt generated successfully")
-        print(f"Video prompt: {video_prompt}")
 
-        response = model.generate_content(f"""
-Simplify {video_prompt}. Reduce it to 10 words, it should be very concise and clear. It is a Ad.
-Prompt should be like: an object performing an action in a specific environment. It should be generalized, not product name like "a cat is walking".     
+def generate_video_prompts(forms, trends_data):
+    """
+    Video prompts of several products, in the order of `forms`, from a single Gemini call
+    sharing one trend context. Cached prompts are not asked for again; the prompt of a
+    product is None when the call failed.
+    """
+    cache_keys = [prompt_cache_key(form_data, trends_data) for form_data in forms]
+    cached = prompt_cache.get_many(cache_keys)
+    prompts = [cached.get(key) for key in cache_keys]
+    missing = [index for index, prompt in enumerate(prompts) if prompt is None]
+    if not missing:
+        return prompts
 
-        """
-        )
+    try:
+        model = genai.GenerativeModel(GEMINI_VIDEO_MODEL)
+        prompt = build_batch_video_prompt_request([forms[index] for index in missing], get_trend_context(trends_data))
+        config = {"response_mime_type": "application/json", "response_schema": batch_video_prompt_schema(len(missing))}
 
-        video_prompt = response.text
+        start = time.perf_counter()
+        response = model.generate_content(prompt, generation_config=config)
+        record_gemini_usage(response, time.perf_counter() - start, "batch_video_prompt")
 
-        logger.info("Video prompt simplified successfully")
-        print(f"Simplified video prompt: {video_prompt}")
+        results = json.loads(response.text)
+        if len(results) != len(missing):
+            raise ValueError(f"expected {len(missing)} prompts, got {len(results)}")
+        # Check every result before filling any prompt, a malformed answer leaves them all to the jobs
+        generated_prompts = [result["video_prompt"].strip() for result in results]
 
-        return video_prompt
+        generated = {}
+        for index, video_prompt in zip(missing, generated_prompts):
+            prompts[index] = video_prompt
+            generated[cache_keys[index]] = video_prompt
+        prompt_cache.put_many(generated)
+        logger.info(f"Generated {len(missing)} video prompts in one call ({len(forms) - len(missing)} cached)")
 
     except Exception as e:
-        logger.error(f"Error generating video prompt: {e}")
-        return None
+        gemini_errors.inc(call="batch_video_prompt", error=type(e).__name__)
+        logger.error(f"Error generating batched video prompts: {e}")
+    return prompts
+
+
+def video_download_name(prompt):
+    """Download file name derived from the first line of the video prompt"""
+    prompt_for_filename = prompt.split('\n')[0] if prompt else "generated_video"
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '', prompt_for_filename.replace(' ', '_'))[:30]
+    return f"{safe_name or 'generated_video'}.mp4"
+
 
+def build_video_payload(video_prompt, **kwargs):
+    """Request body for the video generation API"""
+    # Default parameters
+    return {
+        "prompt": video_prompt,
+        # "negative_prompt": kwargs.get("negative_prompt", "low quality, blurry, artifacts"),
+        "num_inference_steps": kwargs.get("num_inference_steps", 50),
+        # "guidance_scale": kwargs.get("guidance_scale", 7.5),
+        # "height": kwargs.get("height", 256),
+        # "width": kwargs.get("width", 256),
+        # "num_frames": kwargs.get("num_frames", 24),
+        # "fps": kwargs.get("fps", 8)
+    }
 
-def call_video_generation_api(video_prompt, **kwargs):
+
+def call_video_generation_api(video_prompt, relay=False, **kwargs):
     """
     Call external video generation API with the prompt and optional parameters
 
     Parameters:
     - video_prompt (str): Text prompt for video generation
+    - relay (bool): For video/mp4 answers return {'stream': chunk generator, ...} relaying
+      the upstream body as it arrives, instead of downloading it first
     - kwargs: Optional parameters for video generation
         - negative_prompt (str): Negative prompt for video generation
         - num_inference_steps (int): Number of inference steps
@@ -87,48 +200,94 @@ def call_video_generation_api(video_prompt, **kwargs):
             "Content-Type": "application/json"
         }
 
-        # Default parameters
-        payload = {
-            "prompt": video_prompt,
-            # "negative_prompt": kwargs.get("negative_prompt", "low quality, blurry, artifacts"),
-            "num_inference_steps": kwargs.get("num_inference_steps", 50),
-            # "guidance_scale": kwargs.get("guidance_scale", 7.5),
-            # "height": kwargs.get("height", 256),
-            # "width": kwargs.get("width", 256),
-            # "num_frames": kwargs.get("num_frames", 24),
-            # "fps": kwargs.get("fps", 8)
-        }
+        payload = build_video_payload(video_prompt, **kwargs)
+
+        # Same prompt and parameters give the same video, reuse it when cached
+        cache_key = video_cache.key(payload)
+        cached = video_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Video served from cache")
+            if 'video_path' in cached:
+                return {'video_path': cached['video_path'], 'prompt': video_prompt}
+            return cached
 
         # Stream the response to get the file directly
-        with requests.post(VIDEO_API_URL, headers=headers, json=payload, stream=True) as response:
+        with pipeline_stages.time(stage="video_request"):
+            response = upstream_request("POST", VIDEO_API_URL, headers=headers, json=payload, stream=True)
+        relaying = False
+        try:
             response.raise_for_status()
 
             # Check if the response is JSON or a file
             content_type = response.headers.get('Content-Type', '')
 
             if 'application/json' in content_type:
-                return {'json_response': response.json()}
+                json_response = response.json()
+                video_cache.put_json(cache_key, json_response)
+                return {'json_response': json_response}
+            elif 'video/mp4' in content_type and relay:
+                # The generator owns the upstream response from here on
+                relaying = True
+                content_length = response.headers.get('Content-Length')
+                if response.headers.get('Content-Encoding'):
+                    content_length = None
+                return {
+                    'stream': _relay_video(response, cache_key),
+                    'content_length': content_length,
+                    'prompt': video_prompt
+                }
             elif 'video/mp4' in content_type:
-                # Create a temporary file for the video
-                import tempfile
-                import os
-
-                temp_dir = tempfile.gettempdir()
-                video_filename = f"generated_video_{os.urandom(4).hex()}.mp4"
-                video_path = os.path.join(temp_dir, video_filename)
-
-                print(f"Saving video to {video_path}")
+                # Write the video into the cache, it is moved in place once complete
+                temp_path = video_cache.temp_path_for(cache_key)
+                try:
+                    with pipeline_stages.time(stage="video_download"), open(temp_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                            f.write(chunk)
+                    video_path = video_cache.put_file(cache_key, temp_path)
+                except Exception:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
 
-                # Write the video file
-                with open(video_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                logger.debug(f"Saved video to {video_path}")
 
                 return {'video_path': video_path, 'prompt': video_prompt}
             else:
                 logger.error(f"Unexpected content type: {content_type}")
                 return None
+        finally:
+            if not relaying:
+                response.close()
 
     except Exception as e:
         logger.error(f"Error calling video generation API: {e}")
         return None
+
+
+def _relay_video(response, cache_key):
+    """
+    Yield the upstream video chunks as they arrive, copying them into the video cache
+    when VIDEO_STREAM_TEE is enabled. Closing the generator (the client went away) closes
+    the upstream connection and discards the partial copy.
+    """
+    temp_path = video_cache.temp_path_for(cache_key) if VIDEO_STREAM_TEE else None
+    complete = False
+    start = time.perf_counter()
+    try:
+        with open(temp_path, 'wb') if temp_path else nullcontext() as f:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if f is not None:
+                    f.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        response.close()
+        if complete:
+            pipeline_stages.observe(time.perf_counter() - start, stage="video_download")
+        if temp_path:
+            if complete:
+                video_cache.put_file(cache_key, temp_path)
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+        if not complete:
+            logger.info("Video stream closed before the upstream response was complete")
@@ -0,0 +1,9 @@
+"""
+WSGI entry point for production: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is built without connecting to MongoDB or starting threads, the post_fork
+hook in gunicorn.conf.py starts those in every worker.
+"""
+from app import create_app
+
+app = create_app(start=False)
@@ -19,10 +19,12 @@ def generate_ai_analysis(analysis_data, domain=None):
         domain_context = f"in the {domain} domain" if domain else "across social media"
         
         # Extract key information for analysis
-        top_hashtags = list(analysis_data.get("top_hashtags", {}).keys())[:10]
+        top_hashtags = list((analysis_data.get("top_canonical_hashtags") or analysis_data.get("top_hashtags", {})).keys())[:10]
         top_words = list(analysis_data.get("top_words", {}).keys())[:10]
+        distinctive_terms = list(analysis_data.get("distinctive_terms", {}).keys())[:10]
         top_trends = analysis_data.get("top_trends", [])[:10]
         sentiment_data = analysis_data.get("sentiment", {})
+        rising_terms = [item["term"] for item in analysis_data.get("trend_velocity", {}).get("rising", [])[:10]]
         
         # Get platform-specific data
         reddit_data = analysis_data.get("platform_data", {}).get("reddit", {})
@@ -42,8 +44,12 @@ def generate_ai_analysis(analysis_data, domain=None):
         
         Top Keywords: {', '.join(top_words) if top_words else 'None available'}
         
+        Distinctive Keywords (unusual compared to previous runs): {', '.join(distinctive_terms) if distinctive_terms else 'None available'}
+        
         Top Trends: {', '.join(top_trends) if top_trends else 'None available'}
         
+        Rising Terms (accelerating since previous runs): {', '.join(rising_terms) if rising_terms else 'None available'}
+        
         Overall Sentiment: {sentiment_data.get('overall_mood', 'neutral')}
         
         Sample Content:
@@ -1,10 +1,12 @@
 import os
+import datetime
 import logging
 from dotenv import load_dotenv
 import praw
 from googleapiclient.discovery import build
 from atproto import Client
 import google.generativeai as genai
+from trend_indexes import ensure_trend_indexes, verify_trend_index_usage
 
 # Load environment variables
 load_dotenv()
@@ -102,3 +104,100 @@ def save_trend_analysis(analysis_doc):
     except Exception as e:
         logger.error(f"Failed to store data in MongoDB: {e}")
         return False
+
+def load_trend_state(state_id):
+    """Load persisted cross-run state (e.g. decayed trend counters) from MongoDB"""
+    try:
+        db = get_db_connection()
+        if db is None:
+            return None
+        
+        return db["trend_state"].find_one({"_id": state_id})
+    except Exception as e:
+        logger.error(f"Failed to load trend state '{state_id}' from MongoDB: {e}")
+        return None
+
+def save_trend_state(state_id, state):
+    """Persist cross-run state to MongoDB, replacing the previous version"""
+    try:
+        db = get_db_connection()
+        if db is None:
+            return False
+        
+        db["trend_state"].replace_one({"_id": state_id}, state, upsert=True)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to store trend state '{state_id}' in MongoDB: {e}")
+        return False
+
+def load_trend_counters(state_id, kind, terms):
+    """
+    Persisted decayed counters of one state and kind, for the given terms plus the terms
+    flagged as fading candidates, as a dict of term to counter document
+    """
+    try:
+        db = get_db_connection()
+        if db is None:
+            return None
+        
+        ids = [f"{state_id}:{kind}:{term}" for term in terms]
+        query = {"$or": [{"_id": {"$in": ids}}, {"state": state_id, "kind": kind, "fading_candidate": True}]}
+        return {doc["term"]: doc for doc in db["trend_counters"].find(query)}
+    except Exception as e:
+        logger.error(f"Failed to load trend counters '{state_id}:{kind}' from MongoDB: {e}")
+        return None
+
+def save_trend_counters(state_id, kind, counters):
+    """Upsert the given term counters (a dict of term to fields) with one bulk write"""
+    try:
+        db = get_db_connection()
+        if db is None or not counters:
+            return False
+        
+        from pymongo import UpdateOne
+        db["trend_counters"].bulk_write([
+            UpdateOne({"_id": f"{state_id}:{kind}:{term}"},
+                      {"$set": {"state": state_id, "kind": kind, "term": term, **fields}}, upsert=True)
+            for term, fields in counters.items()
+        ], ordered=False)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to store trend counters '{state_id}:{kind}' in MongoDB: {e}")
+        return False
+
+def migrate_trend_timestamps(db=None, batch_size=500):
+    """One-time migration of ISO string timestamps to native BSON datetimes (idempotent)"""
+    try:
+        db = db if db is not None else get_db_connection()
+        if db is None:
+            return 0
+        
+        from pymongo import UpdateOne
+        collection = db["trends"]
+        migrated = 0
+        updates = []
+        
+        for doc in collection.find({"timestamp": {"$type": "string"}}, {"timestamp": 1}):
+            try:
+                timestamp = datetime.datetime.fromisoformat(doc["timestamp"])
+            except ValueError:
+                logger.warning(f"Skipping document {doc['_id']} with unparseable timestamp {doc['timestamp']!r}")
+                continue
+            # Stored timestamps are UTC, drop any offset so all documents are naive UTC
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"timestamp": timestamp}}))
+            
+            if len(updates) >= batch_size:
+                migrated += collection.bulk_write(updates, ordered=False).modified_count
+                updates = []
+        
+        if updates:
+            migrated += collection.bulk_write(updates, ordered=False).modified_count
+        
+        if migrated:
+            logger.info(f"Migrated {migrated} trend documents to datetime timestamps")
+        return migrated
+    except Exception as e:
+        logger.error(f"Failed to migrate trend timestamps: {e}")
+        return 0
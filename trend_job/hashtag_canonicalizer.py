@@ -0,0 +1,170 @@
+import os
+import re
+import math
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from nltk.corpus import brown, words
+from api_clients import logger
+
+# Number of distinct hashtags whose canonical form is memoized
+HASHTAG_CACHE_SIZE = int(os.getenv("HASHTAG_CACHE_SIZE", "50000"))
+
+# Longest word the segmenter will consider
+MAX_WORD_LENGTH = 20
+
+# Splits camelCase / PascalCase hashtags, keeping acronyms and numbers together
+CAMEL_CASE_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+|[^\W\d_]+')
+
+# Collected words are merged into the segmentation table every this many job cycles (6 hours at
+# the 30 minute schedule), memoized segmentations stay valid in between
+UNIGRAM_REFRESH_CYCLES = int(os.getenv("UNIGRAM_REFRESH_CYCLES", "12"))
+
+# Collected words kept in the table on top of the corpus, the most frequent ones
+COLLECTED_VOCABULARY_SIZE = int(os.getenv("COLLECTED_VOCABULARY_SIZE", "20000"))
+
+# Share of their count previously collected words keep at each refresh, so stale vocabulary fades out
+COLLECTED_DECAY = 0.5
+
+# Unigram frequency table used for segmentation: the word corpus, loaded lazily, plus collected words
+_corpus_counts = None
+_corpus_total = 0
+_collected_counts = Counter()
+_collected_total = 0
+
+# Words collected since the last refresh, and the cycles seen since (the first cycle refreshes)
+_pending_counts = Counter()
+_cycles_since_refresh = UNIGRAM_REFRESH_CYCLES
+
+
+def _load_unigram_counts():
+    """Build the unigram table from the Brown corpus, falling back to the plain word list"""
+    global _corpus_counts, _corpus_total
+
+    try:
+        _corpus_counts = Counter(word.lower() for word in brown.words() if word.isalpha())
+    except LookupError:
+        try:
+            _corpus_counts = Counter(word.lower() for word in words.words())
+        except LookupError:
+            logger.warning("No NLTK word corpus available, hashtag segmentation will rely on collected words only")
+            _corpus_counts = Counter()
+
+    _corpus_total = sum(_corpus_counts.values())
+
+
+def update_unigram_counts(word_counts):
+    """
+    Add the words collected in this cycle to the unigram table so new names segment correctly.
+    They are merged every UNIGRAM_REFRESH_CYCLES cycles, the only time memoized results are dropped.
+    """
+    global _collected_counts, _collected_total, _cycles_since_refresh
+
+    # One-off tokens (usernames, typos) would only bloat the table
+    _pending_counts.update({word: count for word, count in word_counts.items() if count > 1})
+    _cycles_since_refresh += 1
+    if _cycles_since_refresh < UNIGRAM_REFRESH_CYCLES:
+        # Keep the pending words bounded too until they are merged
+        if len(_pending_counts) > 2 * COLLECTED_VOCABULARY_SIZE:
+            top = _pending_counts.most_common(COLLECTED_VOCABULARY_SIZE)
+            _pending_counts.clear()
+            _pending_counts.update(dict(top))
+        return
+
+    merged = Counter({word: count * COLLECTED_DECAY for word, count in _collected_counts.items()})
+    merged.update(_pending_counts)
+    _collected_counts = Counter(dict(merged.most_common(COLLECTED_VOCABULARY_SIZE)))
+    _collected_total = sum(_collected_counts.values())
+    _pending_counts.clear()
+    _cycles_since_refresh = 0
+
+    # Segmentations depend on the table, so memoized results are no longer valid
+    canonicalize_hashtag.cache_clear()
+    logger.info(f"Refreshed the hashtag segmentation table with {len(_collected_counts)} collected words")
+
+
+def _word_cost(word):
+    """Negative log probability of a word, unknown words are penalized by their length"""
+    count = _corpus_counts.get(word, 0) + _collected_counts.get(word, 0)
+    total = max(_corpus_total + _collected_total, 1)
+    if count:
+        return math.log(total / count)
+    return math.log(total) + 2.3 * len(word)
+
+
+def segment_words(text):
+    """Viterbi segmentation of a lowercase string into the most probable word sequence"""
+    if _corpus_counts is None:
+        _load_unigram_counts()
+
+    best_cost = [0.0] + [math.inf] * len(text)
+    best_start = [0] * (len(text) + 1)
+
+    for end in range(1, len(text) + 1):
+        for start in range(max(0, end - MAX_WORD_LENGTH), end):
+            cost = best_cost[start] + _word_cost(text[start:end])
+            if cost < best_cost[end]:
+                best_cost[end] = cost
+                best_start[end] = start
+
+    segmented = []
+    end = len(text)
+    while end > 0:
+        start = best_start[end]
+        segmented.append(text[start:end])
+        end = start
+    return list(reversed(segmented))
+
+
+@lru_cache(maxsize=HASHTAG_CACHE_SIZE)
+def canonicalize_hashtag(tag):
+    """
+    Canonical form of a hashtag: Unicode-normalized, case-folded and split into words.
+
+    "#ArtificialIntelligence", "artificialintelligence" and "ARTIFICIALINTELLIGENCE"
+    all become "artificial intelligence".
+    """
+    tag = unicodedata.normalize('NFKC', tag).lstrip('#')
+
+    # Underscores and mixed case carry word boundaries, otherwise fall back to segmentation
+    parts = []
+    for chunk in filter(None, tag.split('_')):
+        if chunk != chunk.lower() and chunk != chunk.upper():
+            parts.extend(CAMEL_CASE_PATTERN.findall(chunk) or [chunk])
+        else:
+            parts.append(chunk)
+
+    canonical = []
+    for part in parts:
+        part = part.casefold()
+        if part.isdigit() or len(part) <= 3:
+            canonical.append(part)
+        else:
+            canonical.extend(segment_words(part))
+    return " ".join(canonical)
+
+
+def canonicalize_hashtag_counts(raw_counts):
+    """
+    Merge raw hashtag counts into canonical hashtag counts.
+
+    Besides case and segmentation variants, an acronym such as "ai" is merged into a
+    multi-word tag seen in the same batch whose initials spell it ("artificial intelligence"),
+    as long as exactly one such tag exists.
+    """
+    canonical_counts = Counter()
+    for tag, count in raw_counts.items():
+        canonical_counts[canonicalize_hashtag(tag)] += count
+
+    phrases_by_initials = {}
+    for canonical in canonical_counts:
+        tokens = canonical.split()
+        if len(tokens) > 1:
+            phrases_by_initials.setdefault("".join(token[0] for token in tokens), []).append(canonical)
+
+    for canonical in list(canonical_counts):
+        phrases = phrases_by_initials.get(canonical)
+        if phrases and len(phrases) == 1 and " " not in canonical:
+            canonical_counts[phrases[0]] += canonical_counts.pop(canonical)
+
+    return canonical_counts
@@ -0,0 +1,112 @@
+import os
+import time
+import numpy as np
+from scipy import sparse
+from nltk.corpus import stopwords
+from api_clients import logger, load_trend_state, save_trend_state
+from text_processing import tokenize_for_counting
+
+# Document frequencies from past runs lose half their weight every KEYWORD_HISTORY_HALF_LIFE_HOURS
+KEYWORD_HISTORY_HALF_LIFE_HOURS = float(os.getenv("KEYWORD_HISTORY_HALF_LIFE_HOURS", "72"))
+
+# Upper bound on the persisted vocabulary, the rarest terms are dropped first
+MAX_VOCABULARY = int(os.getenv("MAX_KEYWORD_VOCABULARY", "20000"))
+
+# Terms must appear in at least this many documents of the current cycle
+MIN_DOCUMENT_FREQUENCY = 2
+
+
+def _build_term_matrix(texts):
+    """Tokenize texts into a documents x terms CSR matrix of raw counts"""
+    stop_words = set(stopwords.words('english'))
+    vocabulary = {}
+    indices = []
+    indptr = [0]
+
+    for text in texts:
+        if isinstance(text, str):
+            for word in tokenize_for_counting(text, stop_words):
+                indices.append(vocabulary.setdefault(word, len(vocabulary)))
+        indptr.append(len(indices))
+
+    data = np.ones(len(indices), dtype=np.float64)
+    matrix = sparse.csr_matrix((data, np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+                               shape=(len(texts), len(vocabulary)))
+    # Repeated words in a document are stored as duplicate entries until summed
+    matrix.sum_duplicates()
+
+    terms = np.empty(len(vocabulary), dtype=object)
+    for word, index in vocabulary.items():
+        terms[index] = word
+    return matrix, terms
+
+
+def get_distinctive_terms(texts, domain=None, n=20, now=None):
+    """
+    Score the terms of the current cycle by TF-IDF against the rolling document-frequency history.
+
+    Generic words that show up in every run get a low IDF, so the result surfaces what is
+    distinctive right now rather than what is merely frequent. The history is persisted as a
+    compact (terms, document frequency) vocabulary and updated with this cycle's documents.
+    """
+    now = now if now is not None else time.time()
+    state_id = f"keywords:{domain or '*'}"
+
+    matrix, terms = _build_term_matrix(texts)
+    if matrix.nnz == 0:
+        return {}
+
+    # Historical document frequencies, decayed to the current run
+    state = load_trend_state(state_id) or {}
+    history_terms = state.get("terms", [])
+    history_df = np.array(state.get("df", []), dtype=np.float64)
+    history_documents = state.get("documents", 0.0)
+    if state.get("last_run") is not None:
+        decay = 0.5 ** (max(now - state["last_run"], 0) / (KEYWORD_HISTORY_HALF_LIFE_HOURS * 3600))
+        history_df *= decay
+        history_documents *= decay
+
+    history_index = {term: index for index, term in enumerate(history_terms)}
+    aligned = np.array([history_index.get(term, -1) for term in terms], dtype=np.int64)
+    known = aligned >= 0
+    past_df = np.zeros(len(terms), dtype=np.float64)
+    past_df[known] = history_df[aligned[known]]
+
+    # Current cycle document frequencies and smoothed IDF over history + current cycle
+    current_df = np.asarray((matrix > 0).sum(axis=0)).ravel().astype(np.float64)
+    total_documents = history_documents + matrix.shape[0]
+    idf = np.log((1 + total_documents) / (1 + past_df + current_df)) + 1
+
+    # Sublinear TF, L2-normalized rows, then sum the TF-IDF weight of every term
+    tf = matrix.copy()
+    tf.data = 1 + np.log(tf.data)
+    tfidf = sparse.csr_matrix(tf.multiply(idf))
+    row_norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    row_norms[row_norms == 0] = 1
+    tfidf = sparse.diags(1 / row_norms) @ tfidf
+    scores = np.asarray(tfidf.sum(axis=0)).ravel()
+    scores[current_df < MIN_DOCUMENT_FREQUENCY] = 0
+
+    top = np.argsort(-scores)[:n]
+    distinctive_terms = {terms[i]: round(float(scores[i]), 3) for i in top if scores[i] > 0}
+
+    # Fold the current cycle into the persisted vocabulary
+    if len(history_df):
+        history_df[aligned[known]] += current_df[known]
+    new_terms = list(terms[~known])
+    merged_terms = list(history_terms) + new_terms
+    merged_df = np.concatenate([history_df, current_df[~known]])
+    if len(merged_terms) > MAX_VOCABULARY:
+        keep = np.sort(np.argpartition(-merged_df, MAX_VOCABULARY)[:MAX_VOCABULARY])
+        merged_terms = [merged_terms[i] for i in keep]
+        merged_df = merged_df[keep]
+
+    save_trend_state(state_id, {
+        "last_run": now,
+        "documents": total_documents,
+        "terms": merged_terms,
+        "df": np.round(merged_df, 3).tolist()
+    })
+
+    logger.info(f"Scored {len(terms)} terms against a history of {len(history_terms)} terms")
+    return distinctive_terms
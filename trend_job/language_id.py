@@ -0,0 +1,153 @@
+import os
+import re
+import math
+from collections import Counter
+from nltk.corpus import stopwords
+from api_clients import logger
+
+# Languages whose texts go through word counting and sentiment analysis (ISO 639-1, comma-separated)
+TARGET_LANGUAGES = {lang.strip() for lang in os.getenv("TARGET_LANGUAGES", "en").split(",") if lang.strip()}
+
+# Code used when a text carries too little signal to identify
+UNDETERMINED = "und"
+
+# Latin-script languages identified from character trigram profiles (NLTK stopword list names)
+LATIN_LANGUAGES = {
+    "en": "english",
+    "es": "spanish",
+    "pt": "portuguese",
+    "fr": "french",
+    "de": "german",
+    "it": "italian",
+    "nl": "dutch",
+    "sv": "swedish",
+    "da": "danish",
+    "no": "norwegian",
+    "fi": "finnish",
+    "id": "indonesian",
+    "tr": "turkish",
+    "ro": "romanian",
+    "hu": "hungarian",
+    "ca": "catalan",
+}
+
+# Non-Latin scripts identify the language (or language group) directly
+SCRIPT_PATTERNS = [
+    ("ja", re.compile(r'[\u3040-\u30ff]')),
+    ("ko", re.compile(r'[\uac00-\ud7af\u1100-\u11ff]')),
+    ("zh", re.compile(r'[\u4e00-\u9fff]')),
+    ("ru", re.compile(r'[\u0400-\u04ff]')),
+    ("ar", re.compile(r'[\u0600-\u06ff]')),
+    ("hi", re.compile(r'[\u0900-\u097f]')),
+    ("th", re.compile(r'[\u0e00-\u0e7f]')),
+    ("el", re.compile(r'[\u0370-\u03ff]')),
+    ("he", re.compile(r'[\u0590-\u05ff]')),
+]
+
+# Extra evidence for a whole-word stopword match on top of its trigrams
+STOPWORD_WEIGHT = 2.0
+
+# Texts with fewer recognizable words than this are left undetermined
+MIN_EVIDENCE_WORDS = 2
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+URL_PATTERN = re.compile(r'http\S+|www\.\S+|@\S+')
+
+# Lookup tables built lazily on first use
+_language_codes = None
+_trigram_scores = None
+_stopword_languages = None
+
+
+def _build_profiles():
+    """Build per-language trigram log-probabilities from the NLTK stopword lists"""
+    global _language_codes, _trigram_scores, _stopword_languages
+
+    codes = []
+    trigram_counts = []
+    stopword_languages = {}
+
+    for code, name in LATIN_LANGUAGES.items():
+        try:
+            language_words = [word.lower() for word in stopwords.words(name)]
+        except (LookupError, OSError):
+            logger.warning(f"No stopword list for {name}, it will not be identified")
+            continue
+
+        index = len(codes)
+        codes.append(code)
+        counts = Counter()
+        for word in language_words:
+            counts.update(_trigrams(word))
+            stopword_languages.setdefault(word, []).append(index)
+        trigram_counts.append(counts)
+
+    vocabulary = set().union(*trigram_counts) if trigram_counts else set()
+    denominators = [sum(counts.values()) + 0.5 * len(vocabulary) for counts in trigram_counts]
+    scores = {}
+    for trigram in vocabulary:
+        scores[trigram] = tuple(
+            math.log((counts.get(trigram, 0) + 0.5) / denominator)
+            for counts, denominator in zip(trigram_counts, denominators)
+        )
+
+    _language_codes = codes
+    _trigram_scores = scores
+    _stopword_languages = {word: tuple(indexes) for word, indexes in stopword_languages.items()}
+
+
+def _trigrams(word):
+    padded = f" {word} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def detect_language(text):
+    """
+    Identify the language of a text, returning an ISO 639-1 code or "und".
+
+    Non-Latin scripts are recognized by Unicode range; Latin-script texts are scored
+    against character trigram profiles with a bonus for whole stopword matches.
+    """
+    if not text:
+        return UNDETERMINED
+
+    for code, pattern in SCRIPT_PATTERNS:
+        if pattern.search(text):
+            return code
+
+    if _trigram_scores is None:
+        _build_profiles()
+    if not _language_codes:
+        return UNDETERMINED
+
+    scores = [0.0] * len(_language_codes)
+    evidence_words = 0
+
+    for word in WORD_PATTERN.findall(URL_PATTERN.sub(' ', text.lower())):
+        matched = False
+        for index in _stopword_languages.get(word, ()):
+            scores[index] += STOPWORD_WEIGHT
+            matched = True
+        for trigram in _trigrams(word):
+            row = _trigram_scores.get(trigram)
+            if row is None:
+                continue
+            matched = True
+            for index, score in enumerate(row):
+                scores[index] += score
+        evidence_words += matched
+
+    if evidence_words < MIN_EVIDENCE_WORDS:
+        return UNDETERMINED
+
+    return _language_codes[max(range(len(scores)), key=scores.__getitem__)]
+
+
+def tag_languages(texts):
+    """Return the detected language code for every text, aligned with the input list"""
+    return [detect_language(text) if isinstance(text, str) else UNDETERMINED for text in texts]
+
+
+def is_target_language(language):
+    """Undetermined texts (emoji, links, very short posts) are kept with the target languages"""
+    return language == UNDETERMINED or language in TARGET_LANGUAGES
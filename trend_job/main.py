@@ -2,7 +2,17 @@ import time
 import schedule
 import argparse
 from trend_analyzer import analyze_trends
-from api_clients import logger
+from api_clients import logger, get_db_connection, ensure_trend_indexes, migrate_trend_timestamps, verify_trend_index_usage
+
+def prepare_database():
+    """Create indexes, migrate legacy string timestamps and confirm the indexes are used"""
+    db = get_db_connection()
+    if db is None:
+        return
+    
+    ensure_trend_indexes(db)
+    migrate_trend_timestamps(db)
+    verify_trend_index_usage(db)
 
 def schedule_jobs(domain=None):
     def run_analysis():
@@ -27,4 +37,5 @@ if __name__ == "__main__":
     domain = args.domain
     
     logger.info(f"Starting Social Media Trend Analysis Service with Gemini AI{' for domain: ' + domain if domain else ''}")
+    prepare_database()
     schedule_jobs(domain)
@@ -0,0 +1,155 @@
+import os
+import time
+import argparse
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from nltk.corpus import stopwords
+from api_clients import logger
+from text_processing import tokenize_for_counting, extract_hashtags
+
+# Number of worker processes used for text analytics (defaults to all cores)
+TEXT_WORKERS = int(os.getenv("TEXT_WORKERS", str(os.cpu_count() or 1)))
+
+# Below this many texts the process pool costs more than it saves
+PARALLEL_MIN_TEXTS = int(os.getenv("PARALLEL_MIN_TEXTS", "2000"))
+
+# Shards per worker, more shards balance uneven text lengths better
+SHARDS_PER_WORKER = 4
+
+# Stopwords are loaded once per worker process by the pool initializer
+_worker_stop_words = None
+
+
+def _init_worker():
+    global _worker_stop_words
+    _worker_stop_words = set(stopwords.words('english'))
+
+
+def _count_texts(texts, stop_words):
+    """Map step: count words, phrases and hashtags for one shard of texts"""
+    word_counts = Counter()
+    phrase_counts = Counter()
+    hashtag_counts = Counter()
+
+    for text in texts:
+        if not text:
+            continue
+        hashtag_counts.update(extract_hashtags(text))
+        words = tokenize_for_counting(text, stop_words)
+        word_counts.update(words)
+        phrase_counts.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+
+    return {"words": word_counts, "phrases": phrase_counts, "hashtags": hashtag_counts}
+
+
+def _count_shard(shm_name, offsets):
+    """Worker entry point: decode a shard straight from the shared buffer and count it"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        offsets = array('q', offsets)
+        buffer = shm.buf
+        texts = [bytes(buffer[offsets[i]:offsets[i + 1]]).decode('utf-8')
+                 for i in range(len(offsets) - 1)]
+    finally:
+        shm.close()
+    return _count_texts(texts, _worker_stop_words)
+
+
+def _merge(partials):
+    """Reduce step: sum the per-shard partial counters"""
+    merged = {"words": Counter(), "phrases": Counter(), "hashtags": Counter()}
+    for partial in partials:
+        for kind, counts in partial.items():
+            merged[kind].update(counts)
+    return merged
+
+
+def _pack_texts(texts):
+    """Concatenate texts into one UTF-8 buffer plus the byte offset of every text boundary"""
+    encoded = [text.encode('utf-8') if isinstance(text, str) else b"" for text in texts]
+    offsets = array('q', [0])
+    position = 0
+    for item in encoded:
+        position += len(item)
+        offsets.append(position)
+    return b"".join(encoded), offsets
+
+
+def count_text_features(texts, workers=None):
+    """
+    Count words, two-word phrases and hashtags across a list of texts.
+
+    Large corpora are sharded across a process pool: the texts are packed once into a
+    shared-memory buffer and each task only receives the shard's byte offsets, so strings
+    are never pickled individually. Small corpora are counted in-process.
+    """
+    workers = workers or TEXT_WORKERS
+
+    if workers <= 1 or len(texts) < PARALLEL_MIN_TEXTS:
+        return _count_texts(texts, set(stopwords.words('english')))
+
+    data, offsets = _pack_texts(texts)
+    shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    try:
+        shm.buf[:len(data)] = data
+
+        shard_count = workers * SHARDS_PER_WORKER
+        shard_size = max(1, -(-len(texts) // shard_count))
+        shards = [offsets[start:min(start + shard_size, len(texts)) + 1].tobytes()
+                  for start in range(0, len(texts), shard_size)]
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            partials = executor.map(_count_shard, [shm.name] * len(shards), shards)
+            return _merge(partials)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def benchmark_speedup(texts, core_counts):
+    """Time count_text_features for each worker count and report the speedup over one core"""
+    results = []
+    baseline = None
+
+    for workers in core_counts:
+        start = time.perf_counter()
+        if workers <= 1:
+            _count_texts(texts, set(stopwords.words('english')))
+        else:
+            count_text_features(texts, workers=workers)
+        elapsed = time.perf_counter() - start
+
+        if baseline is None:
+            baseline = elapsed
+        results.append({
+            "workers": workers,
+            "seconds": round(elapsed, 3),
+            "speedup": round(baseline / elapsed, 2) if elapsed > 0 else None
+        })
+        logger.info(f"Text analytics with {workers} worker(s): {elapsed:.3f}s")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the map-reduce text analytics speedup versus core count")
+    parser.add_argument("--input", type=str, help="File with one text per line (defaults to a synthetic corpus)")
+    parser.add_argument("--texts", type=int, default=50000, help="Number of synthetic texts to generate")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        sample = ("Breaking: new #AI model tops the charts as creators share their favourite "
+                  "#TechNews moments and fans react to the latest trailer release")
+        corpus = [f"{sample} {i}" for i in range(args.texts)]
+
+    max_workers = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, max_workers} & set(range(1, max_workers + 1)))
+
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+    for row in benchmark_speedup(corpus, counts):
+        print(f"{row['workers']:>8} {row['seconds']:>10} {row['speedup']:>8}")
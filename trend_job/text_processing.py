@@ -9,6 +9,7 @@ from api_clients import logger
 try:
     nltk.download('punkt', quiet=True)
     nltk.download('stopwords', quiet=True)
+    nltk.download('brown', quiet=True)
 except Exception as e:
     logger.error(f"Failed to download NLTK resources: {e}")
 
@@ -39,9 +40,19 @@ def remove_stopwords(text):
     filtered_text = [word for word in word_tokens if word not in stop_words]
     return ' '.join(filtered_text)
 
-def get_top_words(texts, n=10):
-    """Get top N words from a list of texts"""
-    # Initialize Counter
+def tokenize_for_counting(text, stop_words):
+    """Lowercase, strip punctuation and tokenize a text, dropping stopwords and short tokens"""
+    text = text.lower()
+    text = re.sub(r'[^\w\s]', '', text)
+    words = word_tokenize(text)
+    
+    return [word for word in words 
+            if word.isalnum() 
+            and len(word) > 2 
+            and word not in stop_words]
+
+def count_words(texts):
+    """Count filtered words across a list of texts"""
     word_counts = Counter()
     
     # Get stopwords
@@ -50,20 +61,13 @@ def get_top_words(texts, n=10):
     for text in texts:
         if not isinstance(text, str):
             continue
-            
-        # Tokenize and clean text
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', '', text)
-        words = word_tokenize(text)
-        
-        # Filter words
-        words = [word for word in words 
-                if word.isalnum() 
-                and len(word) > 2 
-                and word not in stop_words]
-        
-        # Update counter
-        word_counts.update(words)
+        word_counts.update(tokenize_for_counting(text, stop_words))
+    
+    return word_counts
+
+def get_top_words(texts, n=10):
+    """Get top N words from a list of texts"""
+    word_counts = count_words(texts)
     
     # Return top N words
     return dict(word_counts.most_common(n))
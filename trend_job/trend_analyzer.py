@@ -1,12 +1,17 @@
 import datetime
 from collections import Counter
 from api_clients import logger, save_trend_analysis
-from text_processing import get_top_words, extract_hashtags
+from parallel_text import count_text_features
+from language_id import tag_languages, is_target_language
+from text_processing import extract_hashtags
+from keyword_engine import get_distinctive_terms
+from hashtag_canonicalizer import update_unigram_counts, canonicalize_hashtag_counts
 from sentiment_analysis import get_aggregate_sentiment
 from collectors.reddit_collector import fetch_reddit_trends
 from collectors.youtube_collector import fetch_youtube_trends
 from collectors.bluesky_collector import fetch_bluesky_trends
 from ai_analysis import generate_ai_analysis
+from trend_velocity import detect_trend_velocity
 
 def analyze_trends(domain=None):
     logger.info(f"Starting trend analysis{' for domain: ' + domain if domain else ''}...")
@@ -17,8 +22,8 @@ def analyze_trends(domain=None):
         domain_keywords = [kw.strip() for kw in domain.split(',')]
         logger.info(f"Using domain keywords: {domain_keywords}")
     
-    # Get the current timestamp
-    timestamp = datetime.datetime.utcnow().isoformat()
+    # Get the current timestamp (stored as a native BSON datetime, in UTC)
+    timestamp = datetime.datetime.utcnow()
     
     # Fetch data from all platforms
     reddit_data = fetch_reddit_trends(domain_keywords)
@@ -44,23 +49,46 @@ def analyze_trends(domain=None):
         for post in bluesky_data["data"].get("popular_posts", []):
             all_texts.append(post.get("text", ""))
     
-    # Analyze the collected data
-    top_words = get_top_words(all_texts)
-    
-    # Get all hashtags
-    all_hashtags = []
+    # Tag every text with its language; only target languages go through the
+    # English tokenizer and sentiment model
+    languages = tag_languages(all_texts)
+    language_volume = dict(Counter(languages).most_common())
+    target_texts = [text for text, language in zip(all_texts, languages) if is_target_language(language)]
+    other_texts = [text for text, language in zip(all_texts, languages) if not is_target_language(language)]
+    logger.info(f"Language filter kept {len(target_texts)} of {len(all_texts)} texts: {language_volume}")
+    
+    # Analyze the collected data (sharded across a process pool for large corpora)
+    text_features = count_text_features(target_texts)
+    word_counts = text_features["words"]
+    top_words = dict(word_counts.most_common(10))
+    
+    # Terms that are distinctive for this cycle compared to the rolling history
+    distinctive_terms = get_distinctive_terms(target_texts, domain)
+    
+    # Count hashtag frequency, hashtags are language independent so other languages count too.
+    # Bluesky's trending hashtags count once each
+    hashtag_counts = text_features["hashtags"]
+    for text in other_texts:
+        hashtag_counts.update(extract_hashtags(text))
     if bluesky_data["success"]:
-        all_hashtags.extend(list(bluesky_data["data"].get("trending_hashtags", {}).keys()))
-    
-    for text in all_texts:
-        all_hashtags.extend(extract_hashtags(text))
+        hashtag_counts.update(list(bluesky_data["data"].get("trending_hashtags", {}).keys()))
     
-    # Count hashtag frequency
-    hashtag_counts = Counter(all_hashtags)
     top_hashtags = dict(hashtag_counts.most_common(30))
     
+    # Merge case, Unicode and segmentation variants (#AI, #ai, #ArtificialIntelligence)
+    update_unigram_counts(word_counts)
+    canonical_hashtag_counts = canonicalize_hashtag_counts(hashtag_counts)
+    top_canonical_hashtags = dict(canonical_hashtag_counts.most_common(30))
+    
+    # Update the decayed cross-run counters and detect rising/fading terms
+    trend_velocity = detect_trend_velocity({
+        "words": word_counts,
+        "hashtags": canonical_hashtag_counts,
+        "phrases": text_features["phrases"]
+    }, domain)
+    
     # Perform sentiment analysis
-    sentiment_data = get_aggregate_sentiment(all_texts)
+    sentiment_data = get_aggregate_sentiment(target_texts)
     
     # Determine overall trend mood
     trend_mood = "neutral"
@@ -94,8 +122,12 @@ def analyze_trends(domain=None):
         "timestamp": timestamp,
         "domain": domain,
         "top_hashtags": top_hashtags,
+        "top_canonical_hashtags": top_canonical_hashtags,
         "top_words": top_words,
+        "distinctive_terms": distinctive_terms,
         "top_trends": top_trends,
+        "trend_velocity": trend_velocity,
+        "language_volume": language_volume,
         "sentiment": {
             "overall_mood": trend_mood,
             "data": sentiment_data
@@ -0,0 +1,58 @@
+"""
+Indexes of the trends and trend_counters collections and the check that the latest-analysis
+query uses them. Needs only pymongo: the server imports this module too, so both processes
+ensure the indexes at startup whichever runs first.
+"""
+import logging
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_trend_indexes(db):
+    """Create the indexes used to read the latest (per-domain) analysis and the trend counters (idempotent)"""
+    try:
+        collection = db["trends"]
+        collection.create_index([("timestamp", DESCENDING)], name="timestamp_desc")
+        collection.create_index([("domain", ASCENDING), ("timestamp", DESCENDING)], name="domain_timestamp_desc")
+
+        # Fading candidates are read every cycle, counters of terms not seen for a long time expire
+        counters = db["trend_counters"]
+        counters.create_index([("state", ASCENDING), ("kind", ASCENDING)], name="fading_candidates",
+                              partialFilterExpression={"fading_candidate": True})
+        counters.create_index("expires_at", name="expires_at_ttl", expireAfterSeconds=0)
+        logger.info("Ensured indexes on the trends collection")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to create indexes on the trends collection: {e}")
+        return False
+
+
+def _plan_stages(plan):
+    """Yield every stage name of a query plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    yield from _plan_stages(plan.get("inputStage"))
+    for stage in plan.get("inputStages", []):
+        yield from _plan_stages(stage)
+    # Slot-based execution engine nests the classic plan under queryPlan
+    yield from _plan_stages(plan.get("queryPlan"))
+
+
+def verify_trend_index_usage(db):
+    """Check that the latest-analysis query is answered by an index scan instead of a collection scan"""
+    try:
+        explain = db["trends"].find({}, {"_id": 1}).sort("timestamp", -1).limit(1).explain()
+        stages = set(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+
+        if "IXSCAN" in stages and "COLLSCAN" not in stages:
+            logger.info("Latest-analysis query uses the timestamp index")
+            return True
+
+        logger.warning(f"Latest-analysis query is not using an index (plan stages: {sorted(stages)})")
+        return False
+    except Exception as e:
+        logger.error(f"Failed to verify query plan for the trends collection: {e}")
+        return False
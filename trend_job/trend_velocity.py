@@ -0,0 +1,195 @@
+import os
+import math
+import time
+import datetime
+from api_clients import logger, load_trend_state, save_trend_state, load_trend_counters, save_trend_counters
+
+# Decayed counters lose half of their weight every VELOCITY_HALF_LIFE_HOURS
+VELOCITY_HALF_LIFE_HOURS = float(os.getenv("VELOCITY_HALF_LIFE_HOURS", "6"))
+
+# Burst detection thresholds
+BURST_Z_THRESHOLD = float(os.getenv("BURST_Z_THRESHOLD", "2.0"))
+BURST_MIN_COUNT = int(os.getenv("BURST_MIN_COUNT", "3"))
+
+# Counters of terms not seen for this many half-lives (weight below 1/1000) expire from the database
+COUNTER_RETENTION_HALF_LIVES = 10
+
+
+class DecayedCounters:
+    """
+    Exponentially-decayed first and second moments of per-cycle term counts.
+
+    Each term stores [weight, square_weight, updated_at]. Decay is applied lazily
+    from updated_at, so a cycle only has to load and write the terms it actually
+    observed, plus the fading candidates: terms whose baseline is still high enough
+    to register a drop. The baseline of a term that is not observed only decreases,
+    so a term leaves the candidates once it falls below BURST_MIN_COUNT and only
+    comes back when it is observed again.
+    """
+
+    def __init__(self, half_life_seconds, terms=None, candidates=None):
+        self.half_life_seconds = half_life_seconds
+        self.terms = terms or {}
+        self.candidates = set(candidates or ())
+        self.dirty = set()
+
+    def _decay(self, elapsed):
+        return 0.5 ** (max(elapsed, 0) / self.half_life_seconds)
+
+    def decayed(self, term, now):
+        """Return the (weight, square_weight) of a term decayed to `now`"""
+        entry = self.terms.get(term)
+        if entry is None:
+            return 0.0, 0.0
+
+        weight, square_weight, updated_at = entry
+        factor = self._decay(now - updated_at)
+        return weight * factor, square_weight * factor
+
+    def baseline(self, term, now, exposure):
+        """
+        Expected per-cycle count of a term and its variance, before the current cycle is added.
+
+        exposure is the decayed number of past cycles, which normalizes the weights so the
+        estimate is unbiased even while the counters are still warming up.
+        """
+        weight, square_weight = self.decayed(term, now)
+        mean = weight / exposure
+        variance = max(square_weight / exposure - mean ** 2, 0.0)
+        return mean, variance
+
+    def add(self, term, count, now):
+        weight, square_weight = self.decayed(term, now)
+        self.terms[term] = [weight + count, square_weight + count ** 2, now]
+        self.dirty.add(term)
+
+    def update_candidates(self, now, exposure):
+        """Flag the terms whose baseline at the next cycle (with `exposure` past cycles) can still fade"""
+        for term in self.dirty | self.candidates:
+            is_candidate = self.baseline(term, now, exposure)[0] >= BURST_MIN_COUNT
+            if is_candidate != (term in self.candidates):
+                self.dirty.add(term)
+                if is_candidate:
+                    self.candidates.add(term)
+                else:
+                    self.candidates.discard(term)
+
+    def changes(self):
+        """Fields to store for the terms changed in this cycle"""
+        changes = {}
+        for term in self.dirty:
+            weight, square_weight, updated_at = self.terms[term]
+            expires_at = updated_at + COUNTER_RETENTION_HALF_LIVES * self.half_life_seconds
+            changes[term] = {
+                "weight": weight,
+                "square_weight": square_weight,
+                "updated_at": updated_at,
+                "fading_candidate": term in self.candidates,
+                "expires_at": datetime.datetime.fromtimestamp(expires_at, datetime.timezone.utc)
+            }
+        return changes
+
+    @classmethod
+    def from_documents(cls, half_life_seconds, documents):
+        terms = {term: [doc["weight"], doc["square_weight"], doc["updated_at"]] for term, doc in documents.items()}
+        candidates = [term for term, doc in documents.items() if doc.get("fading_candidate")]
+        return cls(half_life_seconds, terms, candidates)
+
+
+def burst_score(count, mean, variance):
+    """z-score of an observed count against the decayed baseline (with a Poisson noise floor)"""
+    return (count - mean) / math.sqrt(variance + mean + 1)
+
+
+def detect_trend_velocity(term_counts, domain=None, now=None, top_n=15):
+    """
+    Update the persisted decayed counters with this cycle's counts and detect bursts.
+
+    term_counts maps a kind ("words", "hashtags", "phrases") to a Counter of the counts
+    seen in the current cycle. Returns a dict with "rising" and "fading" lists.
+    """
+    now = now if now is not None else time.time()
+    half_life_seconds = VELOCITY_HALF_LIFE_HOURS * 3600
+    state_id = f"velocity:{domain or '*'}"
+
+    state = load_trend_state(state_id) or {}
+    last_run = state.get("last_run")
+
+    # Counters used to be stored inside the state document, move them to their own documents once
+    for kind, entries in (state.get("counters") or {}).items():
+        counters = DecayedCounters(half_life_seconds, {entry[0]: list(entry[1:]) for entry in entries})
+        counters.dirty = set(counters.terms)
+        counters.update_candidates(last_run, state.get("exposure", 0.0))
+        save_trend_counters(state_id, kind, counters.changes())
+
+    # Decayed number of previous cycles, shared by every term
+    exposure = 0.0
+    if last_run is not None:
+        exposure = state.get("exposure", 0.0) * 0.5 ** (max(now - last_run, 0) / half_life_seconds)
+
+    rising = []
+    fading = []
+
+    for kind, counts in term_counts.items():
+        documents = load_trend_counters(state_id, kind, counts.keys())
+        if documents is None:
+            # Without the stored counters the baselines would look empty and every term would burst
+            logger.warning(f"Skipping trend velocity for {kind}, counters unavailable")
+            continue
+        counters = DecayedCounters.from_documents(half_life_seconds, documents)
+
+        # Bursts are only meaningful once there is a baseline from a previous run
+        if exposure > 0:
+            # Rising terms: only the terms observed in this cycle need to be scored
+            for term, count in counts.items():
+                if count < BURST_MIN_COUNT:
+                    continue
+                mean, variance = counters.baseline(term, now, exposure)
+                z_score = burst_score(count, mean, variance)
+                if z_score >= BURST_Z_THRESHOLD:
+                    rising.append({
+                        "term": term,
+                        "kind": kind,
+                        "count": count,
+                        "expected": round(mean, 2),
+                        "velocity": round(count - mean, 2),
+                        "z_score": round(z_score, 2)
+                    })
+
+            # Fading terms: only the candidates can have a baseline high enough to drop from
+            for term in counters.candidates:
+                mean, variance = counters.baseline(term, now, exposure)
+                if mean < BURST_MIN_COUNT:
+                    continue
+                count = counts.get(term, 0)
+                z_score = burst_score(count, mean, variance)
+                if z_score <= -BURST_Z_THRESHOLD:
+                    fading.append({
+                        "term": term,
+                        "kind": kind,
+                        "count": count,
+                        "expected": round(mean, 2),
+                        "velocity": round(count - mean, 2),
+                        "z_score": round(z_score, 2)
+                    })
+
+        for term, count in counts.items():
+            counters.add(term, count, now)
+        counters.update_candidates(now, exposure + 1)
+        save_trend_counters(state_id, kind, counters.changes())
+
+    save_trend_state(state_id, {
+        "last_run": now,
+        "exposure": exposure + 1,
+        "half_life_seconds": half_life_seconds
+    })
+
+    rising.sort(key=lambda item: item["z_score"], reverse=True)
+    fading.sort(key=lambda item: item["z_score"])
+
+    logger.info(f"Trend velocity: {len(rising)} rising and {len(fading)} fading terms")
+
+    return {
+        "rising": rising[:top_n],
+        "fading": fading[:top_n]
+    }